@@ -0,0 +1,128 @@
+import argparse
+import itertools
+import json
+import sys
+import time
+import numpy as np
+from utilities import add_network_arguments, load_network
+
+def stream_fares(network, lines, out, batch_size=10_000):
+    """
+    Answers a stream of JSON Lines fare queries, writing one JSON result line per query in input order.
+
+    Each query is an object with "start" and "dest" CRS codes (any "id" field is echoed back). Results carry
+    the route as a list of CRS codes and the fare, exactly as journey_planner and journey_fare would give
+    them. Queries that can't be answered get an "error" field (invalidJSON, invalidRequest, invalidCRS or
+    Nohub_InRegionError) and a message instead, and the stream carries on. The input is read batch_size
+    lines at a time and each batch is planned and priced with one call to RailNetwork.plan_batch, so
+    memory use doesn't grow with the length of the stream.
+
+    Returns a dict with the number of records, the number answered and the number of errors.
+    """
+    counts = {"records": 0, "answered": 0, "errors": 0}
+    lines = iter(lines)
+    lines_read = 0
+    while True:
+        batch = list(itertools.islice(lines, batch_size))
+        if not batch:
+            return counts
+        results = _answer_batch(network, batch, lines_read)
+        lines_read += len(batch)
+        out.write("".join(json.dumps(result) + "\n" for result in results))
+        counts["records"] += len(results)
+        errors = sum("error" in result for result in results)
+        counts["errors"] += errors
+        counts["answered"] += len(results) - errors
+
+def price_journeys(network, pairs):
+    """
+    Plans and prices a list of (start, dest) CRS pairs with one RailNetwork.plan_batch call.
+    Returns one dict per pair with the route as a list of CRS codes and the fare, or with an "error"
+    (invalidCRS or Nohub_InRegionError) and a message when the journey can't be priced.
+    """
+    results = [{"start": start, "dest": dest} for start, dest in pairs]
+    valid = []
+    for i, (start, dest) in enumerate(pairs):
+        if start not in network.stations or dest not in network.stations:
+            results[i].update(error="invalidCRS", message="Invalid CRS codes. Both start and destination stations must exist in the network.")
+        else:
+            valid.append(i)
+
+    if valid:
+        routes, n_legs, fares = network.plan_batch([pairs[i][0] for i in valid], [pairs[i][1] for i in valid], fares=True)
+        codes = network.crs_codes(np.maximum(routes, 0)).tolist()
+        for i, route, legs, fare in zip(valid, codes, n_legs.tolist(), fares.tolist()):
+            result = results[i]
+            if legs == 0:
+                result.update(error="Nohub_InRegionError", message=f"No hub stations in the region: {_hubless_region(network, result['start'], result['dest'])}")
+            else:
+                result.update(route=route[:legs + 1], fare=fare)
+    return results
+
+def parse_query(line, number):
+    """Parses one JSON query line, returning (query, None) or (None, error result) for a bad line."""
+    try:
+        query = json.loads(line)
+    except ValueError as e:
+        return None, {"line": number, "error": "invalidJSON", "message": str(e)}
+    if not isinstance(query, dict) or not isinstance(query.get("start"), str) or not isinstance(query.get("dest"), str):
+        return None, {"line": number, "error": "invalidRequest", "message": "Queries need string 'start' and 'dest' fields"}
+    return query, None
+
+def _answer_batch(network, batch, first_line):
+    results = []
+    queries = []   # positions in results of the well-formed queries, with the queries themselves
+    for number, line in enumerate(batch, start=first_line + 1):
+        if not line.strip():
+            continue
+        query, error = parse_query(line, number)
+        if error is not None:
+            results.append(error)
+            continue
+        results.append(None)
+        queries.append((len(results) - 1, query))
+
+    priced = price_journeys(network, [(query["start"], query["dest"]) for _, query in queries])
+    for (i, query), result in zip(queries, priced):
+        results[i] = {"id": query["id"], **result} if "id" in query else result
+    return results
+
+def _hubless_region(network, start, dest):
+    # The region whose missing hub stopped a journey from being planned
+    start_station = network.stations[start]
+    if not start_station.hub and not network.hub_stations(start_station.region):
+        return start_station.region
+    return network.stations[dest].region
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price a JSON Lines stream of {start, dest} journeys.")
+    parser.add_argument("input", nargs="?", default="-", help="JSON Lines file of queries (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="file to write JSON Lines results to (default: stdout)")
+    add_network_arguments(parser)
+    parser.add_argument("--batch-size", type=int, default=10_000, help="queries planned together in one batch")
+    args = parser.parse_args(argv)
+
+    network = load_network(args)
+
+    start = time.perf_counter()
+    # Badly encoded lines are decoded with replacement characters so they become invalidJSON records
+    if args.input == "-":
+        sys.stdin.reconfigure(errors="replace")
+        source_file = sys.stdin
+    else:
+        source_file = open(args.input, encoding="utf-8", errors="replace")
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        counts = stream_fares(network, source_file, out, args.batch_size)
+    finally:
+        if source_file is not sys.stdin:
+            source_file.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{counts['records']} records ({counts['answered']} answered, {counts['errors']} errors) in {elapsed:.2f}s"
+          f" - {counts['records'] / elapsed if elapsed else 0:.0f} records/s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from railway import Station
+from utilities import read_rail_network, synthetic_network
+
+MAX_CSV_STATIONS = 26 ** 3   # the loader only accepts three-letter CRS codes
+
+def network_csv(network):
+    """The stations of a network as station CSV text, in the format read_rail_network reads."""
+    out = io.StringIO()
+    out.write("crs,name,latitude,longitude,region,hub\n")
+    for row in range(network.n_stations()):
+        station = network._station(row)
+        out.write(f"{station.crs},{station.name},{station.lat!r},{station.lon!r},{station.region},{int(station.hub)}\n")
+    return out.getvalue()
+
+def measure(func, repeat=3):
+    """
+    Times func (best of repeat runs, measured with time.perf_counter) and measures its peak memory
+    allocation with tracemalloc in one extra run. Returns (seconds, peak_bytes).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def _hot_paths(network, csv_text, queries, seed):
+    # (name, callable, number of operations it performs) for every benchmarked path
+    rng = np.random.default_rng(seed)
+    n = network.n_stations()
+    starts = rng.integers(0, n, queries)
+    dests = rng.integers(0, n, queries)
+    start_codes = network.crs_codes(starts).tolist()
+    dest_codes = network.crs_codes(dests).tolist()
+    stations = [network._station(row) for row in starts.tolist()]
+    fields = [(s.name, s.region, "ABC", s.lat, s.lon, s.hub) for s in stations]
+    lats = rng.uniform(50.0, 58.5, queries)
+    lons = rng.uniform(-6.0, 2.0, queries)
+    matrix_origins = np.arange(max(1, min(n, 1_000_000 // n)))
+    target = start_codes[0]
+
+    def plot():
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")   # Agg can't show figures
+            network.plot_fares_to(target)
+        plt.close("all")
+
+    return [
+        ("read_rail_network", lambda: read_rail_network(io.StringIO(csv_text)), csv_text.count("\n") - 1),
+        ("Station.__init__", lambda: [Station(*f) for f in fields], queries),
+        ("closest_hub", lambda: [network.closest_hub(s) for s in stations], queries),
+        ("journey_planner", lambda: [_planned(network.journey_planner, a, b) for a, b in zip(start_codes, dest_codes)], queries),
+        ("journey_fare", lambda: [_planned(network.journey_fare, a, b) for a, b in zip(start_codes, dest_codes)], queries),
+        ("plan_batch", lambda: network.plan_batch(starts, dests, fares=True), queries),
+        ("fares_to", lambda: network.fares_to(target), n),
+        ("fare_matrix", lambda: network.fare_matrix(matrix_origins, None), matrix_origins.size * n),
+        ("plot_fares_to", plot, n),
+        ("nearest_stations", lambda: [network.nearest_stations(lat, lon, 5) for lat, lon in zip(lats.tolist(), lons.tolist())], queries),
+        ("nearest_stations_bulk", lambda: network.nearest_stations_bulk(lats, lons, 5), queries),
+    ]
+
+def _threaded_paths(network, queries, seed):
+    # (name, callable over a chunk of work items, number of items) for every path benchmarked across threads
+    rng = np.random.default_rng(seed)
+    n = network.n_stations()
+    start_codes = network.crs_codes(rng.integers(0, n, queries)).tolist()
+    dest_codes = network.crs_codes(rng.integers(0, n, queries)).tolist()
+    stations = [network._station(row) for row in rng.integers(0, n, queries).tolist()]
+    origins = np.arange(max(1, min(n, 1_000_000 // n)))
+    return [
+        ("journey_fare", lambda chunk: [_planned(network.journey_fare, start_codes[i], dest_codes[i]) for i in chunk], queries),
+        ("closest_hub", lambda chunk: [_planned(network.closest_hub, stations[i]) for i in chunk], queries),
+        ("fare_matrix", lambda chunk: network.fare_matrix(origins[chunk], None), origins.size),
+    ]
+
+def thread_scaling(network, threads=(1, 2, 4, 8), queries=1_000, repeat=3, seed=0, only=None):
+    """
+    Throughput of a frozen copy of the network (see RailNetwork.freeze) queried from thread pools of the
+    given sizes, with the same total work split evenly between the threads. Scalar queries such as
+    journey_fare are mostly Python, so they only get faster with more threads on free-threaded CPython
+    builds; fare_matrix spends its time in NumPy array operations, which release the GIL, so it can
+    scale on regular builds too. Returns {"threaded_<path>x<threads>": result}, where each result also
+    has its speedup over the first thread count.
+    """
+    frozen = network.freeze()
+    results = {}
+    for name, func, items in _threaded_paths(frozen, queries, seed):
+        if only and f"threaded_{name}" not in only:
+            continue
+        first = None
+        for n_threads in threads:
+            chunks = [chunk.tolist() for chunk in np.array_split(np.arange(items), n_threads)]
+            with ThreadPoolExecutor(max_workers=n_threads) as pool:
+                seconds, peak = measure(lambda: list(pool.map(func, chunks)), repeat)
+            first = first or seconds
+            results[f"threaded_{name}x{n_threads}"] = {**_result(seconds, peak, items), "speedup": first / seconds}
+    return results
+
+def _gil_enabled():
+    # Free-threaded builds (3.13+) can run without the GIL
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+def _planned(planner, *args):
+    # Journeys through a hubless region raise, which is part of normal use
+    try:
+        return planner(*args)
+    except Exception:
+        return None
+
+def run_benchmarks(sizes=(10_000,), n_regions=12, hub_fraction=0.02, queries=1_000, repeat=3, seed=0, only=None,
+                   threads=None):
+    """
+    Benchmarks the station, loader, planner, fare and plotting hot paths on synthetic networks of the
+    given sizes, and with threads (a sequence of thread counts) their throughput across threads (see
+    thread_scaling). Returns a JSON-serialisable dict with the settings and, per benchmark ("path@size"),
+    the best time in seconds, the time per operation and the peak memory allocated in bytes.
+    """
+    results = {}
+    for size in sizes:
+        start = time.perf_counter()
+        tracemalloc.start()
+        network = synthetic_network(size, n_regions, hub_fraction, seed)
+        build_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[f"synthetic_network@{size}"] = _result(time.perf_counter() - start, build_peak, size)
+        # Larger networks have CRS codes the loader rejects, so it reads the largest valid network instead
+        csv_network = network if size <= MAX_CSV_STATIONS else synthetic_network(MAX_CSV_STATIONS, n_regions, hub_fraction, seed)
+        for name, func, ops in _hot_paths(network, network_csv(csv_network), queries, seed):
+            if only and name not in only:
+                continue
+            seconds, peak = measure(func, repeat)
+            results[f"{name}@{size}"] = _result(seconds, peak, ops)
+        if threads:
+            for name, result in thread_scaling(network, threads, queries, repeat, seed, only).items():
+                results[f"{name}@{size}"] = result
+    return {
+        "settings": {"sizes": list(sizes), "regions": n_regions, "hub_fraction": hub_fraction, "queries": queries,
+                     "repeat": repeat, "seed": seed, "python": platform.python_version(), "numpy": np.__version__,
+                     "threads": list(threads or []), "gil_enabled": _gil_enabled()},
+        "results": results,
+    }
+
+def _result(seconds, peak, ops):
+    return {"seconds": seconds, "per_op": seconds / max(ops, 1), "ops": ops, "peak_bytes": peak}
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Compares benchmark results with a baseline produced by run_benchmarks.
+    Returns a list of (name, baseline seconds, seconds, ratio) for the benchmarks present in both that
+    got more than threshold slower (0.25 = 25%), slowest first.
+    """
+    regressions = []
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or old["seconds"] <= 0:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append((name, old["seconds"], result["seconds"], ratio))
+    return sorted(regressions, key=lambda regression: -regression[3])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the rail network hot paths on synthetic networks.")
+    parser.add_argument("--sizes", default="10000", help="comma-separated network sizes, e.g. 10000,100000,1000000")
+    parser.add_argument("--regions", type=int, default=12)
+    parser.add_argument("--hub-fraction", type=float, default=0.02)
+    parser.add_argument("--queries", type=int, default=1_000, help="journeys, stations and points per benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="comma-separated benchmark names to run")
+    parser.add_argument("--threads", help="comma-separated thread counts to measure throughput scaling with, e.g. 1,2,4,8")
+    parser.add_argument("-o", "--output", help="file to write the JSON results to (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before failing, as a fraction")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks([int(size) for size in args.sizes.split(",")], args.regions, args.hub_fraction,
+                             args.queries, args.repeat, args.seed, args.only.split(",") if args.only else None,
+                             [int(n) for n in args.threads.split(",")] if args.threads else None)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name, old, new, ratio in regressions:
+            print(f"REGRESSION {name}: {old:.6f}s -> {new:.6f}s ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import pytest
+from railway import RailNetwork, Station
+
+@pytest.fixture
+def rail_network():
+    # Two regions with a hub each and a third region without one
+    return RailNetwork([
+        Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False),
+        Station("Station A", "Region A", "HBA", 0, 1, True),
+        Station("Non-Hub Station B", "Region B", "NHB", 0, 3, False),
+        Station("Station B", "Region B", "HBB", 0, 5, True),
+        Station("Non-Hub Station C", "Region C", "NHC", 0, 7, False),
+    ])
+
+@pytest.fixture
+def regional_network():
+    # 20 stations spread over three regions, plus one in a region without hubs
+    stations = [Station(f"Station {i}", f"Region {i % 3}", f"S{chr(65 + i)}A", 50 + 0.3 * i, -2 + 0.2 * i, i % 4 == 0) for i in range(20)]
+    stations.append(Station("Lonely Station", "Region X", "LON", 55, 0, False))
+    return RailNetwork(stations)
@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from railway import RailNetwork
+from snapshot import PREFIX
+
+# State of a worker process: the network mapped from the snapshot and the output matrix mapped from disk
+_worker = {}
+
+def _init_worker(snapshot_path, out_path):
+    _worker["network"] = RailNetwork.load_snapshot(snapshot_path, mmap=True, verify=False)
+    _worker["matrix"] = np.load(out_path, mmap_mode="r+")
+
+def _compute_chunk(chunk, first_row, last_row):
+    # Fares from a block of origin rows to every station, written straight into the shared output file
+    matrix = _worker["matrix"]
+    matrix[first_row:last_row] = _worker["network"].fare_matrix(np.arange(first_row, last_row), None)
+    matrix.flush()
+    return chunk
+
+def compute_fare_matrix(network, out, workers=None, chunk_rows=256, dtype=np.float64, snapshot=None, resume=True):
+    """
+    Computes the full origin-destination fare matrix of a network into a .npy file on disk.
+
+    The origin rows are split into chunks of chunk_rows that a pool of workers processes (os.cpu_count()
+    when workers is None; workers=1 runs in this process). Workers don't receive pickled stations: they
+    memory-map a snapshot of the network (written next to out unless an existing snapshot path is given)
+    and write their rows straight into the memory-mapped output matrix. Finished chunks are recorded in
+    out + ".progress", so with resume=True an interrupted run only computes the chunks still missing.
+    Journeys that can't be planned are NaN, as in RailNetwork.fare_matrix.
+
+    Returns the matrix memory-mapped read-only from out.
+    """
+    out = str(out)
+    if snapshot is None:
+        snapshot = out + ".railsnap"
+        network.save_snapshot(snapshot)
+    n = network.n_stations()
+    dtype = np.dtype(dtype)
+
+    # The progress file starts with the snapshot checksum, size, dtype and chunking so progress recorded
+    # for a different network or output layout is never reused
+    with open(snapshot, "rb") as f:
+        checksum = PREFIX.unpack(f.read(PREFIX.size))[3]
+    signature = f"{checksum} {n} {dtype.str} {chunk_rows}"
+    progress_path = out + ".progress"
+    done = set()
+    if resume and os.path.exists(out) and os.path.exists(progress_path):
+        with open(progress_path) as f:
+            lines = f.read().split()
+        if " ".join(lines[:4]) == signature:
+            done = {int(chunk) for chunk in lines[4:]}
+    if not done:
+        np.lib.format.open_memmap(out, mode="w+", dtype=dtype, shape=(n, n)).flush()
+        with open(progress_path, "w") as f:
+            f.write(signature + "\n")
+
+    chunks = [(chunk, first, min(first + chunk_rows, n)) for chunk, first in enumerate(range(0, n, chunk_rows)) if chunk not in done]
+    with open(progress_path, "a") as progress:
+        def record(chunk):
+            progress.write(f"{chunk}\n")
+            progress.flush()
+
+        if workers == 1 or len(chunks) <= 1:
+            _init_worker(snapshot, out)
+            try:
+                for chunk in chunks:
+                    record(_compute_chunk(*chunk))
+            finally:
+                _worker.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot, out)) as pool:
+                for future in as_completed([pool.submit(_compute_chunk, *chunk) for chunk in chunks]):
+                    record(future.result())
+    return np.load(out, mmap_mode="r")
@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import json
+from batch_fares import parse_query, price_journeys
+from utilities import add_network_arguments, load_network
+
+class FareServer:
+    """
+    Asyncio fare and route server speaking newline-delimited JSON over TCP or a Unix socket.
+
+    Each request line is a {"start", "dest"} query (an "id" field is echoed back) and gets one response
+    line with the route and fare, in the format of batch_fares.price_journeys. Responses on a connection
+    come back in request order, so clients can pipeline.
+
+    Queries arriving within window seconds of each other are coalesced into one vectorised
+    RailNetwork.plan_batch call (run in a worker thread so the event loop stays responsive), and identical
+    queries already waiting or being computed share a single answer. Back-pressure: once max_pending
+    distinct queries are outstanding new ones are answered with an "overloaded" error straight away, and
+    each connection stops reading after max_in_flight unanswered requests.
+    """
+    def __init__(self, network, window=0.002, max_batch=10_000, max_pending=100_000, max_in_flight=1_000):
+        self.network = network
+        self.window = window
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight
+        self._pending = {}   # (start, dest) -> future with the result, while waiting or being computed
+        self._waiting = []   # keys collected for the next batch
+        self._timer = None
+        self.stats = {"queries": 0, "batches": 0, "deduplicated": 0, "rejected": 0}
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """Starts listening on a TCP host/port, or on a Unix socket when path is given."""
+        if path is not None:
+            return await asyncio.start_unix_server(self._serve, path=path)
+        return await asyncio.start_server(self._serve, host, port)
+
+    async def query(self, start, dest):
+        """Answers one query, coalescing it with the other queries arriving around the same time."""
+        self.stats["queries"] += 1
+        key = (start, dest)
+        future = self._pending.get(key)
+        if future is not None:
+            self.stats["deduplicated"] += 1
+        else:
+            if len(self._pending) >= self.max_pending:
+                self.stats["rejected"] += 1
+                return {"start": start, "dest": dest, "error": "overloaded", "message": "Too many pending queries, try again later"}
+            future = self._pending[key] = asyncio.get_running_loop().create_future()
+            self._waiting.append(key)
+            if len(self._waiting) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # The future is shared with the duplicates, so one caller going away mustn't cancel it for the others
+        return dict(await asyncio.shield(future))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        keys, self._waiting = self._waiting, []
+        if keys:
+            asyncio.get_running_loop().create_task(self._run_batch(keys))
+
+    async def _run_batch(self, keys):
+        self.stats["batches"] += 1
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, price_journeys, self.network, keys)
+        except Exception as e:
+            results = [{"start": start, "dest": dest, "error": type(e).__name__, "message": str(e)} for start, dest in keys]
+        for key, result in zip(keys, results):
+            future = self._pending.pop(key)
+            if not future.done():
+                future.set_result(result)
+
+    async def _answer(self, line, number):
+        query, error = parse_query(line, number)
+        if error is not None:
+            return error
+        result = await self.query(query["start"], query["dest"])
+        return {"id": query["id"], **result} if "id" in query else result
+
+    async def _serve(self, reader, writer):
+        # Requests are answered concurrently, but written back in the order they arrived
+        responses = asyncio.Queue(self.max_in_flight)
+
+        async def write_responses():
+            while True:
+                task = await responses.get()
+                if task is None:
+                    return
+                writer.write((json.dumps(await task) + "\n").encode())
+                await writer.drain()
+
+        async def enqueue(task):
+            # Waits for room in the queue unless the writer stops first, e.g. because the client went away
+            put = asyncio.ensure_future(responses.put(task))
+            await asyncio.wait({put, writing}, return_when=asyncio.FIRST_COMPLETED)
+            if not put.done():
+                put.cancel()
+                task.cancel()
+
+        writing = asyncio.create_task(write_responses())
+        number = 0
+        try:
+            while not writing.done():
+                line = await _read_line(reader)
+                if line is None:
+                    number += 1
+                    error = asyncio.get_running_loop().create_future()
+                    error.set_result({"line": number, "error": "invalidRequest", "message": "Request line is too long"})
+                    await enqueue(error)
+                    continue
+                if not line:
+                    break
+                number += 1
+                if line.strip():
+                    # Badly encoded bytes are replaced, so the line gets an invalidJSON answer like any bad line
+                    await enqueue(asyncio.create_task(self._answer(line.decode(errors="replace"), number)))
+            if not writing.done():
+                await enqueue(None)
+            await asyncio.wait({writing})
+        except ConnectionError:
+            pass
+        finally:
+            # Whatever the writer didn't get to is dropped, and its error (if any) is retrieved here
+            writing.cancel()
+            while not responses.empty():
+                task = responses.get_nowait()
+                if task is not None:
+                    task.cancel()
+            if writing.done() and not writing.cancelled():
+                writing.exception()
+            writer.close()
+
+async def _read_line(reader):
+    # The next line from reader, b"" at the end of the stream, or None for a line longer than the stream
+    # limit, which is discarded up to and including its newline even when it arrives in many pieces
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial   # a last line without a newline
+    except asyncio.LimitOverrunError as e:
+        overrun = e
+    while True:
+        await reader.readexactly(overrun.consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as e:
+            overrun = e
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve fares and routes as newline-delimited JSON.")
+    add_network_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--window", type=float, default=0.002, help="seconds to wait for queries to coalesce")
+    args = parser.parse_args(argv)
+
+    network = load_network(args)
+
+    async def serve():
+        server = await FareServer(network, window=args.window).start(args.host, args.port, args.unix)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
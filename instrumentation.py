@@ -0,0 +1,61 @@
+import functools
+import json
+import time
+
+class Instrumentation:
+    """
+    Counters and call timers for the rail network hot paths.
+
+    Counters record events such as distance evaluations, closest-hub lookups, the planner branch each
+    journey took, fares computed and cache hits. Timers record the number of calls and the total time
+    spent in the methods wrapped with timed. Nothing here is used unless RailNetwork.enable_instrumentation
+    was called, so a network without it only pays for an "is None" check on each hot path.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}   # name -> [calls, seconds]
+
+    def reset(self):
+        """Sets every counter and timer back to zero."""
+        # Cleared in place, since the wrappers made by timed hold on to the timers dict
+        self.counters.clear()
+        self.timers.clear()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def timed(self, name, func):
+        """Wraps func so each call is counted and timed under name."""
+        timers = self.timers
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer = timers.setdefault(name, [0, 0.0])
+                timer[0] += 1
+                timer[1] += time.perf_counter() - start
+        return wrapper
+
+    def snapshot(self):
+        """A copy of the current values: {"counters": {name: n}, "timers": {name: {"calls", "seconds"}}}."""
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "timers": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in sorted(self.timers.items())},
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self, prefix="railway"):
+        """The current values in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [f"# HELP {prefix}_events_total Hot path events by kind.", f"# TYPE {prefix}_events_total counter"]
+        lines += [f'{prefix}_events_total{{event="{name}"}} {value}' for name, value in snapshot["counters"].items()]
+        lines += [f"# HELP {prefix}_calls_total Calls of timed methods.", f"# TYPE {prefix}_calls_total counter"]
+        lines += [f'{prefix}_calls_total{{method="{name}"}} {timer["calls"]}' for name, timer in snapshot["timers"].items()]
+        lines += [f"# HELP {prefix}_call_seconds_total Time spent in timed methods.", f"# TYPE {prefix}_call_seconds_total counter"]
+        lines += [f'{prefix}_call_seconds_total{{method="{name}"}} {timer["seconds"]!r}' for name, timer in snapshot["timers"].items()]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,68 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+# Bodies of the RailNetwork.plot_* methods, kept apart so importing railway doesn't import matplotlib
+
+def plot_fares_to(network, crs_code, save=False, **kwargs):
+    # Get the destination station
+    destination_station = network.stations[crs_code]
+
+    # Calculate fare prices to the destination station from all other stations in one vectorised pass
+    fares = network.fares_to(crs_code)
+    others = np.arange(len(fares)) != network._index[crs_code]
+    fare_prices = fares[others & ~np.isnan(fares)]   # skip journeys that can't be planned
+
+    # Plot the histogram
+    plt.hist(fare_prices, **kwargs)
+    plt.title(f"Fare Prices to {destination_station.name.replace(' ','_')}")
+    plt.xlabel("Fare Price (£-GBP)")
+    plt.ylabel("Frequency")
+
+    if save:
+        # Replace spaces with underscores in the station name for filename
+        filename = f"Fare_prices_to_{destination_station.name.replace(' ', '_')}.png"
+        plt.savefig(filename)
+    else:
+        plt.show()
+
+def plot_network(network, marker_size=5):
+    fig, ax = plt.subplots(figsize=(5, 10))
+    ax.set_xlabel("Longitude (degrees)")
+    ax.set_ylabel("Latitude (degrees)")
+    ax.set_title("Railway Network")
+
+    COLOURS = ["b", "r", "g", "c", "m", "y", "k"]
+    MARKERS = [".", "o", "x", "*", "+"]
+
+    for i, r in enumerate(network.regions()):
+        lats = [s.lat for s in network.stations.values() if s.region == r]
+        lons = [s.lon for s in network.stations.values() if s.region == r]
+
+        colour = COLOURS[i % len(COLOURS)]
+        marker = MARKERS[i % len(MARKERS)]
+        ax.scatter(lons, lats, s=marker_size, c=colour, marker=marker, label=r)
+
+    ax.legend()
+    plt.tight_layout()
+    plt.show()
+
+def plot_journey(network, start, dest):
+    # Plot railway network in the background
+    network_lats = [s.lat for s in network.stations.values()]
+    network_lons = [s.lon for s in network.stations.values()]
+
+    fig, ax = plt.subplots(figsize=(5, 10))
+    ax.scatter(network_lons, network_lats, s=1, c="blue", marker="x")
+    ax.set_xlabel("Longitude (degrees)")
+    ax.set_ylabel("Latitude (degrees)")
+
+    # Compute the journey
+    journey = network.journey_planner(start, dest)
+    ax.set_title(f"Journey from {journey[0].name} to {journey[-1].name}")
+
+    # Draw over the network with the journey
+    journey_lats = [s.lat for s in journey]
+    journey_lons = [s.lon for s in journey]
+    ax.plot(journey_lons, journey_lats, "ro-", markersize=2)
+
+    plt.show()
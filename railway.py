@@ -1,7 +1,12 @@
-import matplotlib.pyplot as plt
+import threading
 import numpy as np
 from pathlib import Path
 from typing import List, Dict
+from collections import OrderedDict
+from collections.abc import Mapping
+from spatial import SpatialGrid, chord_length
+from snapshot import write_snapshot, read_snapshot
+from instrumentation import Instrumentation
 
 class CRSDuplicateError(Exception):
     """Exception raised when there are duplicate CRS codes."""
@@ -19,6 +24,10 @@ class invalidCRS(Exception):
     """Exception raised when given CRS is invalid."""
     pass
 
+class FrozenNetworkError(Exception):
+    """Exception raised when trying to change a frozen network."""
+    pass
+
 def fare_price(distance, different_regions, hubs_in_dest_region): 
     """
     This function computes approximation of the cost of a rail fare between two stations.
@@ -31,7 +40,42 @@ def fare_price(distance, different_regions, hubs_in_dest_region):
     calculated_fare_price = 1 + (distance * np.exp(-distance/100) * (1 + (different_regions * hubs_in_dest_region)/10))
     return calculated_fare_price
 
+EARTH_RADIUS = 6371   # Mean Earth radius in km used by the haversine formula
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km between points whose coordinates are given in radians.
+    Works elementwise, so the arguments can be scalars or broadcastable NumPy arrays.
+    """
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2
+    c = 2 * np.arcsin(np.sqrt(a))
+    return EARTH_RADIUS * c
+
+DISTANCE_MODES = ("exact", "approx")
+
+# Largest relative error of equirectangular() against haversine() over every pair of the bundled UK stations
+# (up to 950 km apart, latitudes 50-59 degrees); it grows with the distance and towards the poles
+APPROX_MAX_RELATIVE_ERROR = 0.00036
+
+def equirectangular(lat1, lon1, lat2, lon2, scale1=None, scale2=None):
+    """
+    Fast approximation of haversine(): the distance in km on an equirectangular projection, scaling the
+    longitude difference by the geometric mean of the cosines of the two latitudes (given in radians).
+    scale1 and scale2 can be precomputed square roots of the cosines of lat1 and lat2. Meant for regional
+    networks: the error stays below APPROX_MAX_RELATIVE_ERROR at UK distances and latitudes, and longitudes
+    are not wrapped, so the points mustn't lie either side of the 180 degree meridian.
+    """
+    scale1 = np.sqrt(np.cos(lat1)) if scale1 is None else scale1
+    scale2 = np.sqrt(np.cos(lat2)) if scale2 is None else scale2
+    x = (lon2 - lon1) * scale1 * scale2
+    y = lat2 - lat1
+    return EARTH_RADIUS * np.sqrt(x*x + y*y)
+
 class Station: #represents single station
+    __slots__ = ("name", "region", "crs", "lat", "lon", "hub")
+
     def __init__(self, name:str, region:str, crs:str, lat:float, lon:float, hub:bool):
         # Check and store name as a string
         if not isinstance(name, str):   
@@ -63,6 +107,18 @@ class Station: #represents single station
             raise ValueError("Hub must be a boolean value")
         self.hub = hub
 
+    @classmethod
+    def _from_row(cls, name, region, crs, lat, lon, hub):
+        # Builds a station view over a network row; the columns were validated on load so the checks are skipped
+        station = object.__new__(cls)
+        station.name = name
+        station.region = region
+        station.crs = crs
+        station.lat = float(lat)
+        station.lon = float(lon)
+        station.hub = bool(hub)
+        return station
+
     def __str__(self):
         return f"Station({self.crs}-{self.name}/{self.region}{'-hub' if self.hub else ''})" #string representation
     
@@ -70,109 +126,806 @@ class Station: #represents single station
         return f"Station({self.crs}-{self.name}/{self.region}{'-hub' if self.hub else ''})" 
     
     def distance_to(self, other_station):
-        R = 6371
         # Convert latitude and longitude from degrees to radians
         lat1, lon1, lat2, lon2 = np.radians([self.lat, self.lon, other_station.lat, other_station.lon])
 
         # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = np.sin(dlat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2
-        c = 2 * np.arcsin(np.sqrt(a))
-        distance = R * c
-        return distance
+        return haversine(lat1, lon1, lat2, lon2)
+
+class FrozenStation(Station):
+    """Read-only Station view handed out by frozen networks."""
+    __slots__ = ()
+
+    @classmethod
+    def _from_row(cls, name, region, crs, lat, lon, hub):
+        station = object.__new__(cls)
+        for slot, value in zip(Station.__slots__, (name, region, crs, float(lat), float(lon), bool(hub))):
+            object.__setattr__(station, slot, value)
+        return station
+
+    def __setattr__(self, name, value):
+        raise FrozenNetworkError("Stations of a frozen network are read-only.")
+
+class StationMap(Mapping):
+    """
+    Read-only CRS -> Station mapping over the rows of a RailNetwork.
+    Station objects are only materialised for the rows that are actually looked up.
+    """
+    def __init__(self, network):
+        self._network = network
+
+    def __getitem__(self, crs):
+        return self._network._station(self._network._index[crs])
+
+    def __contains__(self, crs):
+        return crs in self._network._index
+
+    def __iter__(self):
+        return iter(self._network._index)
+
+    def __len__(self):
+        return len(self._network._index)
+
+class _CacheEntry:
+    # A cached journey: CRS codes along the route, its fare once computed and the regions it depends on
+    __slots__ = ("route", "fare", "regions")
+
+    def __init__(self, journey):
+        self.route = tuple(station.crs for station in journey)
+        self.fare = None
+        self.regions = {journey[0].region, journey[-1].region}
+
+class FareCache:
+    """
+    Size-bounded LRU cache of planned journeys and their fares, keyed by (start, dest) CRS codes.
+    journey_planner and journey_fare share the same entries. A journey only goes through stations of
+    its start and destination regions, so entries are dropped whenever either region changes.
+    """
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, journey):
+        entry = self._entries[key] = _CacheEntry(journey)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)   # least recently used
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, regions=None):
+        # Drops every entry (or only those depending on the given regions)
+        if regions is None:
+            self._entries.clear()
+            return
+        regions = set(regions)
+        for key in [key for key, entry in self._entries.items() if not entry.regions.isdisjoint(regions)]:
+            del self._entries[key]
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._entries), "maxsize": self.maxsize}
 
 class RailNetwork: #brings together all the stations from a dataset 
+    _station_type = Station   # class of the station views created for rows
+
     def __init__(self, stations):
-        self.stations = {}
-        
-        for station in stations:
-            if station.crs in self.stations:
+        stations = list(stations)
+        index = {}
+        for row, station in enumerate(stations):
+            if station.crs in index:
                 raise CRSDuplicateError(f"Duplicate CRS code: {station.crs} is not allowed in the same RailNetwork")
-            
-            self.stations[station.crs] = station
+            index[station.crs] = row
+
+        # Regions are stored as integer codes into a table of region names
+        region_names = []
+        region_lookup = {}
+        codes = np.empty(len(stations), dtype=np.int32)
+        for row, station in enumerate(stations):
+            code = region_lookup.get(station.region)
+            if code is None:
+                code = region_lookup[station.region] = len(region_names)
+                region_names.append(station.region)
+            codes[row] = code
+
+        self._build(
+            names=[station.name for station in stations],
+            region_codes=codes,
+            region_names=region_names,
+            crs=[station.crs for station in stations],
+            lat=[station.lat for station in stations],
+            lon=[station.lon for station in stations],
+            hub=[station.hub for station in stations],
+            index=index,
+            objects=stations,
+        )
+
+    @classmethod
+    def from_columns(cls, names, regions, crs, lat, lon, hub, region_names=None):
+        """
+        Builds a network straight from column arrays, without creating Station objects.
+        regions holds the region name of each station, or integer codes into region_names when that is given.
+        The values are assumed to be valid already (see utilities.read_rail_network); duplicate CRS codes
+        still raise CRSDuplicateError.
+        """
+        if region_names is None:
+            region_names, first, codes = np.unique(np.asarray(regions, dtype=str), return_index=True, return_inverse=True)
+            # Number the regions in order of first appearance, like the Station based constructor
+            order = np.argsort(first)
+            rank = np.empty(order.size, dtype=np.int32)
+            rank[order] = np.arange(order.size, dtype=np.int32)
+            regions = rank[codes]
+            region_names = region_names[order].tolist()
+
+        # The columns are copied so that changes to the network never write into the caller's arrays
+        network = cls.__new__(cls)
+        network._build(names, np.array(regions, dtype=np.int32), list(region_names), np.array(crs, dtype=str),
+                       np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64), np.array(hub, dtype=bool))
+        return network
+
+    # Attributes making up the stored state of a network; everything else is derived from them on load
+    _STATE = ("_names", "_crs", "_lat", "_lon", "_lat_rad", "_lon_rad", "_hub", "_region_codes", "_region_names",
+              "_nearest_hub", "_nearest_hub_distance", "_region_rows", "_region_hubs")
+
+    def save_snapshot(self, path):
+        """
+        Saves the network, including its region indexes and closest-hub table, to a versioned binary
+        snapshot file (see snapshot.py) that load_snapshot can map straight into memory.
+        """
+        state = {name.lstrip("_"): getattr(self, name) for name in self._STATE}
+        write_snapshot(path, {**state, "distance_mode": [self._distance_mode]})
+
+    @classmethod
+    def load_snapshot(cls, path, mmap=True, verify=True):
+        """
+        Loads a network saved with save_snapshot. With mmap=True the station arrays are memory-mapped
+        read-only, so worker processes start quickly and share the file's pages; they are copied on the first
+        change. Raises snapshot.SnapshotError for files of another format version or failing the checksum.
+        """
+        state = read_snapshot(path, mmap=mmap, verify=verify)
+        network = cls.__new__(cls)
+        for name in cls._STATE:
+            setattr(network, name, state[name.lstrip("_")])
+        network._region_lookup = {region: code for code, region in enumerate(network._region_names)}
+        network._lat_scale = np.sqrt(np.cos(network._lat_rad))
+        network._distance_mode = state.get("distance_mode", ["exact"])[0]
+        network._region_hub_counts = np.array([hubs.size for hubs in network._region_hubs], dtype=np.int64)
+        network._region_list = [network._region_names[code] for code, rows in enumerate(network._region_rows) if rows.size]
+        network._index = dict(zip(network._crs.tolist(), range(len(network._names))))
+        network._objects = [None] * len(network._names)
+        network._borrowed = set()
+        network.stations = StationMap(network)
+        network._spatial = None
+        network._cache = None
+        network._stats = None
+        network._router = None
+        return network
+
+    def _writable(self, *names):
+        # Arrays shared with a memory-mapped snapshot or another network, and containers shared with another
+        # network, are copied before their first in-place change
+        for name in names:
+            value = getattr(self, name)
+            if name in self._borrowed or (isinstance(value, np.ndarray) and not value.flags.writeable):
+                setattr(self, name, value.copy())
+                self._borrowed.discard(name)
+
+    # Arrays and containers shared between a network and the copies made from it instead of being copied
+    _SHARED = ("_crs", "_lat", "_lon", "_lat_rad", "_lon_rad", "_lat_scale", "_hub", "_region_codes",
+               "_nearest_hub", "_nearest_hub_distance", "_region_hub_counts")
+    _SHARED_CONTAINERS = ("_names", "_index", "_region_names", "_region_lookup", "_region_rows", "_region_hubs")
+
+    def _shared_copy(self, cls):
+        # A network of class cls over the same arrays and containers. The arrays are made read-only and the
+        # containers marked as borrowed in both networks, so whichever of the two changes one first works
+        # on a copy of it (see _writable)
+        network = cls.__new__(cls)
+        for name in self._SHARED:
+            getattr(self, name).flags.writeable = False
+            setattr(network, name, getattr(self, name))
+        for rows in self._region_rows + self._region_hubs:
+            rows.flags.writeable = False
+        for name in self._SHARED_CONTAINERS:
+            setattr(network, name, getattr(self, name))
+        self._borrowed.update(self._SHARED_CONTAINERS)
+        network._borrowed = set(self._SHARED_CONTAINERS)
+        network._region_list = self._region_list   # only ever replaced
+        network._objects = [None] * len(self._names)   # views are never shared, set_hub changes them
+        network.stations = StationMap(network)
+        network._spatial = self._spatial   # a built grid is never changed, only replaced
+        network._cache = None
+        network._stats = None
+        network._router = None
+        network._distance_mode = self._distance_mode
+        return network
+
+    def freeze(self):
+        """
+        Returns a read-only copy of the network that can be queried from many threads at once without
+        locks: journey_planner, journey_fare, closest_hub, cheapest_journey, plan_batch, fare_matrix and
+        the geographic queries only read its arrays. The copy shares the station arrays and region indexes
+        with this network rather than copying them; they become read-only here too, so this network copies
+        an array before its next change to it, as with memory-mapped snapshots. See FrozenRailNetwork.
+        """
+        frozen = self._shared_copy(FrozenRailNetwork)
+        frozen._seal()
+        return frozen
+
+    # Changes derive can make, by the name of the method making them
+    _CHANGES = ("add_station", "remove_station", "set_hub", "update_location", "set_distance_mode")
+
+    def derive(self, changes=()):
+        """
+        Returns a new version of the network with the given changes made to it. Each change is the name of
+        the method making it followed by its arguments, e.g. ("set_hub", "ABW", True) or
+        ("update_location", "ABD", 57.1, -2.1). The version shares its arrays, region tables and per-region
+        indexes with this network and only copies those the changes write to, so keeping many versions
+        costs little more memory than keeping one. Both networks can still be changed independently: each
+        copies a shared array or table before its first change to it. See fare_changes for the fares that
+        differ between two versions.
+        """
+        version = self._shared_copy(RailNetwork if isinstance(self, FrozenRailNetwork) else type(self))
+        for name, *args in changes:
+            if name not in self._CHANGES:
+                raise ValueError(f"Unknown change {name!r}: changes must be one of {self._CHANGES}")
+            getattr(version, name)(*args)
+        return version
+
+    def fare_changes(self, other, block_size=1_000_000):
+        """
+        Journeys between stations of both this network and other, typically two versions made with derive,
+        whose fares differ. A fare only depends on the stations of its start and destination regions, so
+        only the journeys starting or ending in a region with a changed, added or removed station are
+        priced, and arrays the versions still share aren't compared at all. Returns the CRS codes of the
+        starts and destinations of those journeys and their fares here and in other (NaN when a journey
+        can't be planned).
+        """
+        if self._crs is other._crs or np.array_equal(self._crs, other._crs):
+            rows = other_rows = np.arange(len(self._crs))
+        else:
+            rows = np.flatnonzero(np.isin(self._crs, other._crs))
+            other_rows = other._rows(self._crs[rows])
+
+        if self._distance_mode != other._distance_mode:
+            touched = np.ones(rows.size, dtype=bool)
+        else:
+            changed = np.zeros(rows.size, dtype=bool)
+            for name in ("_hub", "_lat", "_lon"):
+                if getattr(self, name) is not getattr(other, name):
+                    changed |= getattr(self, name)[rows] != getattr(other, name)[other_rows]
+            if self._region_codes is not other._region_codes or self._region_names is not other._region_names:
+                changed |= (np.asarray(self._region_names)[self._region_codes[rows]]
+                            != np.asarray(other._region_names)[other._region_codes[other_rows]])
+            # Regions of the changed stations in either network, and of the stations only one of them has
+            regions = set()
+            for network, network_rows in ((self, rows), (other, other_rows)):
+                only = np.ones(len(network._crs), dtype=bool)
+                only[network_rows] = False
+                codes = np.concatenate([network._region_codes[network_rows[changed]], network._region_codes[only]])
+                regions.update(network._region_names[code] for code in np.unique(codes).tolist())
+            touched = np.zeros(rows.size, dtype=bool)
+            for network, network_rows in ((self, rows), (other, other_rows)):
+                codes = [network._region_lookup[region] for region in regions if region in network._region_lookup]
+                touched |= np.isin(network._region_codes[network_rows], codes)
+
+        # Fares from the touched stations to every station, then from the others to the touched stations
+        starts, dests, fares, other_fares = [self._crs[:0]], [self._crs[:0]], [np.empty(0)], [np.empty(0)]
+        inside, outside = np.flatnonzero(touched), np.flatnonzero(~touched)
+        for origins, ends in ((inside, np.arange(rows.size)), (outside, inside)):
+            step = max(1, block_size // max(1, ends.size))
+            for first in range(0, origins.size, step):
+                block = origins[first:first + step]
+                old = self.fare_matrix(rows[block], rows[ends], block_size)
+                new = other.fare_matrix(other_rows[block], other_rows[ends], block_size)
+                i, j = np.nonzero((old != new) & ~(np.isnan(old) & np.isnan(new)))
+                starts.append(self._crs[rows[block[i]]])
+                dests.append(self._crs[rows[ends[j]]])
+                fares.append(old[i, j])
+                other_fares.append(new[i, j])
+        return np.concatenate(starts), np.concatenate(dests), np.concatenate(fares), np.concatenate(other_fares)
+
+    def _build(self, names, region_codes, region_names, crs, lat, lon, hub, index=None, objects=None):
+        # Columnar store: one entry per station row, in the order the stations were given
+        self._names = list(names)
+        self._crs = np.asarray(crs, dtype=str)
+        self._lat = np.asarray(lat, dtype=np.float64)
+        self._lon = np.asarray(lon, dtype=np.float64)
+        self._lat_rad = np.radians(self._lat)
+        self._lon_rad = np.radians(self._lon)
+        self._lat_scale = np.sqrt(np.cos(self._lat_rad))   # used by the approximate distance mode
+        self._hub = np.asarray(hub, dtype=bool)
+        self._region_codes = region_codes
+        self._region_names = region_names
+        self._region_lookup = {region: code for code, region in enumerate(region_names)}
+
+        if index is None:
+            index = dict(zip(self._crs.tolist(), range(len(self._names))))
+            if len(index) != len(self._names):
+                duplicate = next(crs for crs, count in zip(*np.unique(self._crs, return_counts=True)) if count > 1)
+                raise CRSDuplicateError(f"Duplicate CRS code: {duplicate} is not allowed in the same RailNetwork")
+        self._index = index
+        self._objects = list(objects) if objects is not None else [None] * len(self._names)
+        self._borrowed = set()   # names of the containers shared with another network
+        self.stations = StationMap(self)
+        self._spatial = None
+        self._cache = None
+        self._stats = None
+        self._router = None
+        self._distance_mode = "exact"
+        self._index_regions()
+
+    def _index_regions(self):
+        # Persistent region indexes: station rows, hub rows and hub count per region code, plus the region list
+        n_regions = len(self._region_names)
+        order = np.argsort(self._region_codes, kind="stable")
+        bounds = np.cumsum(np.bincount(self._region_codes, minlength=n_regions))[:-1]
+        self._region_rows = np.split(order, bounds)
+        hub_order = order[self._hub[order]]
+        hub_bounds = np.cumsum(np.bincount(self._region_codes[hub_order], minlength=n_regions))[:-1]
+        self._region_hubs = np.split(hub_order, hub_bounds)
+        self._region_hub_counts = np.array([hubs.size for hubs in self._region_hubs], dtype=np.int64)
+        self._region_list = [self._region_names[code] for code in range(n_regions) if self._region_rows[code].size]
+
+        # Closest in-region hub of every row and the distance to it (the row itself for hubs, -1/NaN without hubs)
+        self._nearest_hub = np.where(self._hub, np.arange(self._hub.size), -1)
+        self._nearest_hub_distance = np.where(self._hub, 0.0, np.nan)
+        for code in range(n_regions):
+            self._assign_nearest_hubs(code)
+
+    def _assign_nearest_hubs(self, code, rows=None, block_size=1_000_000):
+        # Fills the closest-hub table for the non-hub rows of a region (all of them unless rows is given)
+        hub_rows = self._region_hubs[code]
+        if rows is None:
+            rows = self._region_rows[code]
+        rows = rows[~self._hub[rows]]
+        self._writable("_nearest_hub", "_nearest_hub_distance")
+        if hub_rows.size == 0:
+            self._nearest_hub[rows] = -1
+            self._nearest_hub_distance[rows] = np.nan
+            return
+        if hub_rows.size > 64:
+            rows = self._nearest_hubs_by_grid(rows, hub_rows, block_size)
+        # Stations are processed in blocks so the station x hub distance matrix stays bounded
+        step = max(1, block_size // hub_rows.size)
+        for first in range(0, rows.size, step):
+            block = rows[first:first + step]
+            distances = self._distances(block[:, None], hub_rows[None, :])
+            closest = np.argmin(distances, axis=1)
+            self._nearest_hub[block] = hub_rows[closest]
+            self._nearest_hub_distance[block] = distances[np.arange(block.size), closest]
+
+    def _nearest_hubs_by_grid(self, rows, hub_rows, block_size):
+        # Regions with many hubs only compare each station with the hubs in the grid cells around it.
+        # Returns the rows whose closest hub might lie outside those cells, which still need a full scan.
+        grid = SpatialGrid(self._lat_rad[hub_rows], self._lon_rad[hub_rows], points_per_cell=2)
+        reach = 2 * EARTH_RADIUS * np.arcsin(min(grid.cell_size / 2, 1)) * (1 - 1e-9)
+        if self._distance_mode == "approx":
+            reach *= 0.99   # approximate distances can come out slightly shorter than the exact ones
+        unresolved = []
+        step = max(1, block_size // 64)
+        for first in range(0, rows.size, step):
+            block = rows[first:first + step]
+            queries, candidates = grid.neighbourhood(self._lat_rad[block], self._lon_rad[block])
+            distances = self._distances(block[queries], hub_rows[candidates])
+            if queries.size == 0:
+                unresolved.append(block)
+                continue
+            # Closest candidate of each station (the pairs come grouped by station), ties going to the
+            # earliest hub like np.argmin
+            starts = np.flatnonzero(np.r_[True, queries[1:] != queries[:-1]])
+            group = np.cumsum(np.r_[False, queries[1:] != queries[:-1]])
+            shortest = np.minimum.reduceat(distances, starts)
+            closest = np.minimum.reduceat(np.where(distances == shortest[group], candidates, hub_rows.size), starts)
+            stations = queries[starts]
+            # Any hub outside the searched cells is further away than reach
+            found = shortest < reach
+            self._nearest_hub[block[stations[found]]] = hub_rows[closest[found]]
+            self._nearest_hub_distance[block[stations[found]]] = shortest[found]
+            resolved = np.zeros(block.size, dtype=bool)
+            resolved[stations[found]] = True
+            unresolved.append(block[~resolved])
+        return np.concatenate(unresolved) if unresolved else rows[:0]
+
+    def _index_region(self, code):
+        # Refreshes the indexes of a single region after its stations or hub flags changed
+        self._writable("_region_rows", "_region_hubs")
+        while code >= len(self._region_rows):
+            self._region_rows.append(np.empty(0, dtype=np.intp))
+            self._region_hubs.append(np.empty(0, dtype=np.intp))
+            self._region_hub_counts = np.append(self._region_hub_counts, 0)
+        rows = np.flatnonzero(self._region_codes == code)
+        self._region_rows[code] = rows
+        self._region_hubs[code] = rows[self._hub[rows]]
+        self._writable("_region_hub_counts")
+        self._region_hub_counts[code] = self._region_hubs[code].size
+        self._region_list = [self._region_names[c] for c in range(len(self._region_rows)) if self._region_rows[c].size]
+        self._writable("_nearest_hub", "_nearest_hub_distance")
+        self._nearest_hub[self._region_hubs[code]] = self._region_hubs[code]
+        self._nearest_hub_distance[self._region_hubs[code]] = 0.0
+        self._assign_nearest_hubs(code)
+        self.invalidate_cache([self._region_names[code]])
+
+    def _station(self, row):
+        # Returns the Station object for a row, creating the view on first access
+        station = self._objects[row]
+        if station is None:
+            station = self._objects[row] = self._station_type._from_row(
+                self._names[row], self._region_names[self._region_codes[row]], str(self._crs[row]),
+                self._lat[row], self._lon[row], self._hub[row])
+        return station
+
+    def _distances(self, rows_a, rows_b):
+        # Haversine distances between the stations in rows_a and rows_b (broadcast like NumPy arrays)
+        if self._distance_mode == "approx":
+            distances = equirectangular(self._lat_rad[rows_a], self._lon_rad[rows_a], self._lat_rad[rows_b], self._lon_rad[rows_b],
+                                        self._lat_scale[rows_a], self._lat_scale[rows_b])
+        else:
+            distances = haversine(self._lat_rad[rows_a], self._lon_rad[rows_a], self._lat_rad[rows_b], self._lon_rad[rows_b])
+        if self._stats is not None:
+            self._stats.count("distance_evaluations", np.size(distances))
+        return distances
+
+    def _region_code(self, region):
+        code = self._region_lookup.get(region)
+        if code is None or self._region_rows[code].size == 0:
+            raise RegionnonExistentError(f"Region '{region}' does not exist in the network.")
+        return code
 
     def __str__(self):
         return f"{list(self.stations.values())}"
     
     def regions(self):
-        unique_regions = set(station.region for station in self.stations.values())   #goes through the list of stations, and assigns each unique regiong to a variable
-        return list(unique_regions)
+        return list(self._region_list)   #regions are indexed when the network is built
 
     def n_stations(self):
-        return len(self.stations)
+        return len(self._index)
 
     def hub_stations(self, region: str = None):
         if region is None:  #if no specific region is provided returns all hub stations in the network
-            return [station for station in self.stations.values() if station.hub]
-        elif region not in self.regions():  #if provided region does not exist in the network, raises an error
-            raise RegionnonExistentError(f"Region '{region}' does not exist in the network.")
-        else:   #returns all hub stations in the region provided
-            return [station for station in self.stations.values() if station.hub and station.region == region]
+            return [self._station(row) for row in np.flatnonzero(self._hub)]
+        code = self._region_code(region)   #raises an error if the region does not exist in the network
+        #returns all hub stations in the region provided
+        return [self._station(row) for row in self._region_hubs[code]]
 
     def closest_hub(self, s):
-        if s.region not in self.regions():
-            raise RegionnonExistentError(f"Region '{s.region}' does not exist in the network.")
+        code = self._region_code(s.region)
 
         if s.hub:
             return s  # If the station itself is a hub, return it
 
-        region = s.region
-
         # Get all hub stations in the same region
-        hub_stations_in_region = [station for station in self.stations.values() if station.hub and station.region == region]
+        hub_rows = self._region_hubs[code]
 
-        if not hub_stations_in_region:
+        if hub_rows.size == 0:
             # If there are no hub stations in the region, raise an appropriate error
-            raise Nohub_InRegionError(f"No hub stations in the region: {region}")
+            if self._stats is not None:
+                self._stats.count("closest_hub_missing")
+            raise Nohub_InRegionError(f"No hub stations in the region: {s.region}")
+
+        # Stations of the network are answered from the closest-hub table built with the network
+        row = self._index.get(s.crs)
+        if row is not None and self._region_codes[row] == code and self._lat[row] == s.lat and self._lon[row] == s.lon:
+            if self._stats is not None:
+                self._stats.count("closest_hub_table")
+            return self._station(self._nearest_hub[row])
 
-        # Find the closest hub station using the distance_to() method
-        closest_hub_station = min(hub_stations_in_region, key=lambda hub: s.distance_to(hub))
+        # Otherwise find the closest hub station with one vectorised haversine over the region's hubs
+        lat, lon = np.radians([s.lat, s.lon])
+        if self._distance_mode == "approx":
+            distances = equirectangular(lat, lon, self._lat_rad[hub_rows], self._lon_rad[hub_rows], scale2=self._lat_scale[hub_rows])
+        else:
+            distances = haversine(lat, lon, self._lat_rad[hub_rows], self._lon_rad[hub_rows])
+        if self._stats is not None:
+            self._stats.count("closest_hub_scan")
+            self._stats.count("distance_evaluations", distances.size)
+        return self._station(hub_rows[np.argmin(distances)])
+
+    def add_station(self, station):
+        """Adds a station to the network, updating the indexes of its region only."""
+        if station.crs in self._index:
+            raise CRSDuplicateError(f"Duplicate CRS code: {station.crs} is not allowed in the same RailNetwork")
+        self._writable("_names", "_index", "_region_names", "_region_lookup")
+        code = self._region_lookup.get(station.region)
+        if code is None:
+            code = self._region_lookup[station.region] = len(self._region_names)
+            self._region_names.append(station.region)
+
+        row = len(self._names)
+        self._names.append(station.name)
+        self._crs = np.append(self._crs, station.crs)
+        self._lat = np.append(self._lat, float(station.lat))
+        self._lon = np.append(self._lon, float(station.lon))
+        self._lat_rad = np.append(self._lat_rad, np.radians(self._lat[row]))
+        self._lat_scale = np.append(self._lat_scale, np.sqrt(np.cos(self._lat_rad[row])))
+        self._lon_rad = np.append(self._lon_rad, np.radians(self._lon[row]))
+        self._hub = np.append(self._hub, station.hub)
+        self._region_codes = np.append(self._region_codes, np.int32(code))
+        self._nearest_hub = np.append(self._nearest_hub, row if station.hub else -1)
+        self._nearest_hub_distance = np.append(self._nearest_hub_distance, 0.0 if station.hub else np.nan)
+        self._index[station.crs] = row
+        self._objects.append(station)
+        self._spatial = None
+        self._router = None
+
+        if station.hub or code >= len(self._region_rows):
+            self._index_region(code)
+        else:
+            # A new non-hub station doesn't change any other journey, it only needs its own closest hub
+            self._writable("_region_rows")
+            self._region_rows[code] = np.append(self._region_rows[code], row)
+            if self._region_rows[code].size == 1:
+                self._region_list = [self._region_names[c] for c in range(len(self._region_rows)) if self._region_rows[c].size]
+            self._assign_nearest_hubs(code, np.array([row]))
 
-        return closest_hub_station
+    def remove_station(self, crs):
+        """Removes a station from the network; the rows after it move up by one."""
+        if crs not in self._index:
+            raise invalidCRS(f"Station {crs} not found in the network.")
+        self._writable("_names", "_index", "_region_rows", "_region_hubs")
+        row = self._index.pop(crs)
+        code = self._region_codes[row]
+        was_hub = self._hub[row]
+
+        del self._names[row]
+        del self._objects[row]
+        for name in ("_crs", "_lat", "_lon", "_lat_rad", "_lon_rad", "_lat_scale", "_hub", "_region_codes", "_nearest_hub", "_nearest_hub_distance"):
+            setattr(self, name, np.delete(getattr(self, name), row))
+        for later in self._crs[row:].tolist():
+            self._index[later] -= 1
+
+        # Row references held by the indexes shift down past the removed row
+        self._nearest_hub[self._nearest_hub > row] -= 1
+        for indexes in (self._region_rows, self._region_hubs):
+            for c, rows in enumerate(indexes):
+                rows = rows[rows != row]
+                indexes[c] = rows - (rows > row)
+        self._spatial = None
+        self._router = None
+
+        if was_hub or self._region_rows[code].size == 0:
+            self._index_region(code)
+        else:
+            self.invalidate_cache([self._region_names[code]])
+
+    def set_hub(self, crs, hub=True):
+        """Promotes a station to a hub (or demotes it with hub=False), re-indexing its region."""
+        if crs not in self._index:
+            raise invalidCRS(f"Station {crs} not found in the network.")
+        if not isinstance(hub, bool):
+            raise ValueError("Hub must be a boolean value")
+        row = self._index[crs]
+        if self._hub[row] == hub:
+            return
+        self._writable("_hub")
+        self._hub[row] = hub
+        self._router = None
+        if self._objects[row] is not None:
+            self._objects[row].hub = hub
+        self._index_region(self._region_codes[row])
+
+    def update_location(self, crs, lat, lon):
+        """Moves a station to new coordinates, updating the closest-hub table and cached fares it affects."""
+        if crs not in self._index:
+            raise invalidCRS(f"Station {crs} not found in the network.")
+        if not isinstance(lat, (float, int)) or lat < -90 or lat > 90:
+            raise ValueError("Latitude must be a decimal number in the range [-90, 90]")
+        if not isinstance(lon, (float, int)) or lon < -180 or lon > 180:
+            raise ValueError("Longitude must be a decimal number in the range [-180, 180]")
+        row = self._index[crs]
+        code = self._region_codes[row]
+        self._writable("_lat", "_lon", "_lat_rad", "_lon_rad", "_lat_scale")
+        self._lat[row] = lat
+        self._lon[row] = lon
+        self._lat_rad[row] = np.radians(self._lat[row])
+        self._lat_scale[row] = np.sqrt(np.cos(self._lat_rad[row]))
+        self._lon_rad[row] = np.radians(self._lon[row])
+        if self._objects[row] is not None:
+            self._objects[row].lat = lat
+            self._objects[row].lon = lon
+        self._spatial = None
+
+        if self._hub[row]:
+            self._router = None
+            self._index_region(code)   # every station of the region may now have a different closest hub
+        else:
+            self._assign_nearest_hubs(code, np.array([row]))
+            self.invalidate_cache([self._region_names[code]])
+
+    def _spatial_index(self):
+        # Spatial grid over the station coordinates, built on the first geographic query
+        if self._spatial is None:
+            self._spatial = SpatialGrid(self._lat_rad, self._lon_rad)
+        return self._spatial
+
+    def nearest_stations(self, lat, lon, k=1):
+        """The k stations closest to the point (lat, lon), given in degrees, nearest first."""
+        rows, _ = self.nearest_stations_bulk([lat], [lon], k)
+        return [self._station(row) for row in rows[0]]
+
+    def nearest_stations_bulk(self, lats, lons, k=1):
+        """
+        Nearest stations for arrays of query points given in degrees.
+        Returns the rows of the k closest stations to each point, nearest first, and the distances
+        to them in km, both as arrays of shape (number of points, k).
+        """
+        grid = self._spatial_index()
+        lat_rad = np.radians(np.asarray(lats, dtype=np.float64)).ravel()
+        lon_rad = np.radians(np.asarray(lons, dtype=np.float64)).ravel()
+        k = min(k, len(grid))
+        rows = np.empty((lat_rad.size, k), dtype=np.intp)
+        for i in range(lat_rad.size):
+            rows[i] = grid.nearest(lat_rad[i], lon_rad[i], k)
+        distances = haversine(lat_rad[:, None], lon_rad[:, None], self._lat_rad[rows], self._lon_rad[rows])
+        return rows, distances
+
+    def stations_within(self, crs_or_point, radius_km):
+        """
+        Stations within radius_km of a station, given by its CRS code, or of a (lat, lon) point in degrees,
+        nearest first. A station given by CRS code is included in its own result.
+        """
+        if isinstance(crs_or_point, str):
+            if crs_or_point not in self._index:
+                raise invalidCRS(f"Station {crs_or_point} not found in the network.")
+            row = self._index[crs_or_point]
+            lat, lon = self._lat_rad[row], self._lon_rad[row]
+        else:
+            lat, lon = np.radians(np.asarray(crs_or_point, dtype=np.float64))
+        # The chord search is padded slightly so rounding can't drop stations right on the boundary
+        rows = self._spatial_index().within(lat, lon, chord_length(radius_km, EARTH_RADIUS) * (1 + 1e-9) + 1e-12)
+        distances = haversine(lat, lon, self._lat_rad[rows], self._lon_rad[rows])
+        keep = distances <= radius_km
+        rows, distances = rows[keep], distances[keep]
+        return [self._station(row) for row in rows[np.argsort(distances, kind="stable")]]
+
+    def set_distance_mode(self, mode):
+        """
+        Chooses how closest hubs, journeys and fares measure distances: "exact" (haversine, the default)
+        or "approx" (equirectangular, cheaper to evaluate and within APPROX_MAX_RELATIVE_ERROR of the
+        exact distance at UK distances and latitudes). Each leg's fare
+        then differs from the exact one by at most (1 + hubs in its destination region / 10) times its
+        distance error in km, unless a station's closest hub changes because two hubs are almost equally far.
+        The closest-hub table is rebuilt and cached journeys are dropped.
+        """
+        if mode not in DISTANCE_MODES:
+            raise ValueError(f"Distance mode must be one of {DISTANCE_MODES}")
+        if mode == self._distance_mode:
+            return
+        self._distance_mode = mode
+        for code in range(len(self._region_rows)):
+            self._assign_nearest_hubs(code)
+        self._router = None
+        self.invalidate_cache()
+
+    def enable_cache(self, maxsize=1024):
+        """Turns on memoisation of journey_planner and journey_fare results, keeping at most maxsize journeys."""
+        self._cache = FareCache(maxsize)
+
+    def disable_cache(self):
+        self._cache = None
+
+    def invalidate_cache(self, regions=None):
+        """Forgets cached journeys touching the given regions (all of them when regions is None)."""
+        if self._cache is not None:
+            self._cache.invalidate(regions)
+
+    def cache_info(self):
+        """Hit, miss and eviction counts and the size of the journey cache, or None when caching is off."""
+        return self._cache.info() if self._cache is not None else None
+
+    # Methods whose calls are counted and timed while instrumentation is on
+    _TIMED = ("journey_planner", "journey_fare", "closest_hub", "plan_batch", "fare_matrix",
+              "nearest_stations_bulk", "stations_within")
+
+    def enable_instrumentation(self):
+        """
+        Starts counting hot path events (distance evaluations, closest-hub lookups, planner branches, fares
+        computed, cache hits and misses) and timing the main query methods. Returns the Instrumentation
+        object holding the values; see instrumentation_snapshot and reset_instrumentation.
+        """
+        if self._stats is None:
+            self._stats = Instrumentation()
+            for name in self._TIMED:
+                # Timers wrap the bound methods on the instance, so they cost nothing once removed again
+                setattr(self, name, self._stats.timed(name, getattr(self, name)))
+        return self._stats
+
+    def disable_instrumentation(self):
+        for name in self._TIMED:
+            self.__dict__.pop(name, None)
+        self._stats = None
+
+    def instrumentation_snapshot(self):
+        """Current counter and timer values (see Instrumentation.snapshot), or None when instrumentation is off."""
+        return self._stats.snapshot() if self._stats is not None else None
+
+    def reset_instrumentation(self):
+        if self._stats is not None:
+            self._stats.reset()
+
+    def _count_cache(self, entry):
+        if self._stats is not None:
+            self._stats.count("cache_misses" if entry is None else "cache_hits")
 
     def journey_planner(self, start, dest):
+        if self._cache is None:
+            return self._plan_journey(start, dest)
+        entry = self._cache.get((start, dest))
+        self._count_cache(entry)
+        if entry is None:
+            journey = self._plan_journey(start, dest)
+            self._cache.put((start, dest), journey)
+            return journey
+        return [self.stations[crs] for crs in entry.route]
+
+    def _plan_journey(self, start, dest):
         if start not in self.stations or dest not in self.stations:
             raise invalidCRS("Invalid CRS codes. Both start and destination stations must exist in the network.")
 
         start_station = self.stations[start]
         dest_station = self.stations[dest]
-        closest_hub_start = self.closest_hub(start_station)
-        closest_hub_dest = self.closest_hub(dest_station)
 
         # Check if the journey is within the same region or between hub stations
         if start_station.region == dest_station.region:
             # Case: A and B are within the same region
             journey = [start_station, dest_station]
+            branch = "same_region"
         elif start_station.hub and dest_station.hub:
             # Case: A and B are both hub stations
-            journey = [start_station, dest_station] 
+            journey = [start_station, dest_station]
+            branch = "hub_hub"
         elif start_station.hub and not dest_station.hub:
             # Case: A is a hub while B isn't
-            journey = [start_station, closest_hub_dest, dest_station]
+            journey = [start_station, self.closest_hub(dest_station), dest_station]
+            branch = "hub_nonhub"
         elif not start_station.hub and dest_station.hub:
             # Case: A isn't a hub while B is
-            journey = [start_station, closest_hub_start, dest_station]
+            journey = [start_station, self.closest_hub(start_station), dest_station]
+            branch = "nonhub_hub"
         else:
             # Case: A and B aren't hub stations
-            journey = [start_station, closest_hub_start, closest_hub_dest, dest_station]
+            journey = [start_station, self.closest_hub(start_station), self.closest_hub(dest_station), dest_station]
+            branch = "nonhub_nonhub"
 
+        if self._stats is not None:
+            self._stats.count("planner_" + branch)
         return journey
 
     def journey_fare(self, start, dest, summary=False):
         start_station = self.stations[start]
         dest_station = self.stations[dest]  
-        # Use journey_planner to get the journey details
-        journey = self.journey_planner(start, dest)
-        # Calculate the fare for each leg of the journey
-        total_fare = 0.0
-        for i in range(len(journey) - 1):
-            leg_start = journey[i]
-            leg_dest = journey[i + 1]
-            leg_distance = leg_start.distance_to(leg_dest)
-            hubs_in_dest_region = sum(station.hub for station in self.stations.values() if station.region == leg_dest.region)
-            leg_fare = fare_price(leg_distance, leg_start.region != leg_dest.region, hubs_in_dest_region)
-            total_fare += leg_fare
+        if self._cache is None:
+            # Use journey_planner to get the journey details
+            journey = self._plan_journey(start, dest)
+            total_fare = self._journey_cost(journey)
+        else:
+            # Route and fare share one cache entry, so a journey planned earlier only needs pricing
+            entry = self._cache.get((start, dest))
+            self._count_cache(entry)
+            if entry is None:
+                journey = self._plan_journey(start, dest)
+                entry = self._cache.put((start, dest), journey)
+            else:
+                journey = [self.stations[crs] for crs in entry.route]
+            if entry.fare is None:
+                entry.fare = self._journey_cost(journey)
+            total_fare = entry.fare
         if summary:
             # Print the summary
             print(f"Journey from: {start_station.name} ({start}) to {dest_station.name} ({dest})")
@@ -181,37 +934,171 @@ class RailNetwork: #brings together all the stations from a dataset
         else:
             return total_fare
 
+    def cheapest_journey(self, start, dest):
+        """
+        Cheapest-fare journey between two stations, allowing any number of hubs along the way (see
+        routing.HubRouter), alongside journey_planner's fixed routes. Returns the list of stations
+        and the fare. The hub-to-hub fare table is built on first use and again after the hubs change.
+        """
+        if start not in self.stations or dest not in self.stations:
+            raise invalidCRS("Invalid CRS codes. Both start and destination stations must exist in the network.")
+        if self._router is None:
+            from routing import HubRouter
+            self._router = HubRouter(self)
+        route, fare = self._router.route(self._index[start], self._index[dest])
+        return [self._station(row) for row in route], fare
+
+    def _journey_cost(self, journey):
+        # Calculate the fare for each leg of the journey and add them up
+        rows = np.array([[self._index[station.crs] for station in journey]])
+        return self._route_fares(rows, np.array([len(journey) - 1]))[0]
+
+    def _rows(self, codes):
+        # Converts a CRS code, or a sequence of CRS codes / row indices, into an array of rows
+        if isinstance(codes, str):
+            codes = [codes]
+        codes = np.atleast_1d(np.asarray(codes))
+        if codes.dtype.kind in "iu":
+            if codes.size and (codes.min() < 0 or codes.max() >= len(self._index)):
+                raise invalidCRS("Row indices must refer to stations in the network.")
+            return codes.astype(np.intp)
+        try:
+            return np.fromiter((self._index[code] for code in codes.tolist()), dtype=np.intp, count=codes.size)
+        except KeyError as e:
+            raise invalidCRS(f"Invalid CRS code {e.args[0]}: station does not exist in the network.") from None
+
+    def _plan_rows(self, start_rows, dest_rows):
+        """
+        Vectorised journey_planner over arrays of start and destination rows.
+        Returns an (N, 4) array with the station rows of each route (padded with -1) and the number
+        of legs of each route; journeys that journey_planner can't plan get 0 legs.
+        """
+        start_rows = np.asarray(start_rows, dtype=np.intp)
+        dest_rows = np.asarray(dest_rows, dtype=np.intp)
+        n = start_rows.size
+        start_hub = self._hub[start_rows]
+        dest_hub = self._hub[dest_rows]
+        hub_start = self._nearest_hub[start_rows]
+        hub_dest = self._nearest_hub[dest_rows]
+
+        # Same region or hub to hub journeys go direct, otherwise each non-hub end goes through its closest hub
+        same_region = self._region_codes[start_rows] == self._region_codes[dest_rows]
+        direct = same_region | (start_hub & dest_hub)
+        via_start = ~direct & ~start_hub
+        via_dest = ~direct & ~dest_hub
+
+        routes = np.full((n, 4), -1, dtype=np.intp)
+        position = np.arange(n)
+        routes[:, 0] = start_rows
+        routes[via_start, 1] = hub_start[via_start]
+        stop = 1 + via_start
+        routes[position[via_dest], stop[via_dest]] = hub_dest[via_dest]
+        stop = stop + via_dest
+        routes[position, stop] = dest_rows
+        n_legs = stop
+
+        # Only journeys that actually need to go through a missing hub fail, as in journey_planner
+        failed = (via_start & (hub_start < 0)) | (via_dest & (hub_dest < 0))
+        routes[failed] = -1
+        n_legs[failed] = 0
+        if self._stats is not None:
+            self._count_branches(same_region, direct, start_hub, dest_hub, failed)
+        return routes, n_legs
+
+    def _count_branches(self, same_region, direct, start_hub, dest_hub, failed):
+        # Planner branch counts of a vectorised batch under the same names as in _plan_journey,
+        # which only counts journeys it could plan
+        planned = ~failed
+        count = self._stats.count
+        count("planner_same_region", np.count_nonzero(same_region & planned))
+        count("planner_hub_hub", np.count_nonzero(direct & ~same_region & planned))
+        count("planner_hub_nonhub", np.count_nonzero(~direct & start_hub & planned))
+        count("planner_nonhub_hub", np.count_nonzero(~direct & dest_hub & planned))
+        count("planner_nonhub_nonhub", np.count_nonzero(~direct & ~start_hub & ~dest_hub & planned))
+        count("planner_failed", np.count_nonzero(failed))
+
+    def _route_fares(self, routes, n_legs):
+        # Total fare of each route, summing the legs in order exactly as journey_fare does (NaN for unplanned routes)
+        hub_counts = self._region_hub_counts
+        total = np.zeros(len(n_legs))
+        for leg in range(routes.shape[1] - 1):
+            active = n_legs > leg
+            leg_start = routes[active, leg]
+            leg_dest = routes[active, leg + 1]
+            start_region = self._region_codes[leg_start]
+            dest_region = self._region_codes[leg_dest]
+            distance = self._distances(leg_start, leg_dest)
+            total[active] += fare_price(distance, start_region != dest_region, hub_counts[dest_region])
+        total[n_legs == 0] = np.nan
+        if self._stats is not None:
+            self._stats.count("fares_computed", np.count_nonzero(n_legs))
+        return total
+
+    def plan_batch(self, starts, dests, fares=False, block_size=1_000_000):
+        """
+        Plans many journeys at once with the journey_planner routing rules.
+        starts and dests are equal-length sequences of CRS codes or station rows.
+
+        Returns an (N, 4) int32 array with the station rows of each route, padded with -1, and an int8
+        vector with the number of legs of each route (0 when the route needs a hub its region doesn't have).
+        With fares=True the fare of each route is computed in the same pass and returned as a third array.
+        """
+        start_rows = self._rows(starts)
+        dest_rows = self._rows(dests)
+        if start_rows.size != dest_rows.size:
+            raise ValueError("starts and dests must have the same length")
+        routes = np.empty((start_rows.size, 4), dtype=np.int32 if len(self._index) < 2**31 else np.int64)
+        n_legs = np.empty(start_rows.size, dtype=np.int8)
+        route_fares = np.empty(start_rows.size) if fares else None
+        for first in range(0, start_rows.size, block_size):
+            block = slice(first, first + block_size)
+            block_routes, block_legs = self._plan_rows(start_rows[block], dest_rows[block])
+            routes[block] = block_routes
+            n_legs[block] = block_legs
+            if fares:
+                route_fares[block] = self._route_fares(block_routes, block_legs)
+        if fares:
+            return routes, n_legs, route_fares
+        return routes, n_legs
+
+    def crs_codes(self, rows):
+        """CRS codes of the stations in the given rows, e.g. of routes returned by plan_batch."""
+        return self._crs[np.asarray(rows, dtype=np.intp)]
+
+    def fare_matrix(self, origins=None, dests=None, block_size=1_000_000):
+        """
+        Fares between every origin and every destination, following the journey_planner routing rules.
+        origins and dests are sequences of CRS codes or rows (all stations when omitted).
+        Returns a (len(origins), len(dests)) array; journeys that can't be planned are NaN.
+        The pairs are evaluated in blocks of about block_size so memory stays bounded.
+        """
+        origin_rows = np.arange(len(self._index)) if origins is None else self._rows(origins)
+        dest_rows = np.arange(len(self._index)) if dests is None else self._rows(dests)
+        matrix = np.empty((origin_rows.size, dest_rows.size))
+        step = max(1, block_size // max(1, dest_rows.size))
+        for first in range(0, origin_rows.size, step):
+            block = origin_rows[first:first + step]
+            starts = np.repeat(block, dest_rows.size)
+            ends = np.tile(dest_rows, block.size)
+            routes, n_legs = self._plan_rows(starts, ends)
+            matrix[first:first + block.size] = self._route_fares(routes, n_legs).reshape(block.size, dest_rows.size)
+        return matrix
+
+    def fares_to(self, crs):
+        """Fares from every station in the network (in network order) to the station crs."""
+        return self.fare_matrix(None, crs)[:, 0]
+
+    def fares_from(self, crs):
+        """Fares from the station crs to every station in the network (in network order)."""
+        return self.fare_matrix(crs, None)[0]
+
     def plot_fares_to(self, crs_code, save=False, **kwargs):
         # Validate that the destination station exists in the network
         if crs_code not in self.stations:
             raise invalidCRS(f"Destination station {crs_code} not found in the network.")
 
-        # Get the destination station
-        destination_station = self.stations[crs_code]
-
-        # Calculate fare prices to the destination station from all other stations
-        fare_prices = []
-        for station in self.stations.values():
-            if station != destination_station:
-                try:
-                    fare = self.journey_fare(station.crs, crs_code)
-                    fare_prices.append(fare)
-                except ValueError:
-                    # Unable to plan a journey, skip computing fare
-                    pass
-
-        # Plot the histogram
-        plt.hist(fare_prices, **kwargs)
-        plt.title(f"Fare Prices to {destination_station.name.replace(' ','_')}")
-        plt.xlabel("Fare Price (£-GBP)")
-        plt.ylabel("Frequency")
-
-        if save:
-            # Replace spaces with underscores in the station name for filename
-            filename = f"Fare_prices_to_{destination_station.name.replace(' ', '_')}.png"
-            plt.savefig(filename)
-        else:
-            plt.show()
+        from plotting import plot_fares_to   # matplotlib is only imported once something is plotted
+        plot_fares_to(self, crs_code, save, **kwargs)
 
     def plot_network(self, marker_size: int = 5) -> None:
         """
@@ -224,26 +1111,8 @@ class RailNetwork: #brings together all the stations from a dataset
         This function will not execute successfully until you have created the regions() function.
         You are NOT required to write tests nor documentation for this function.
         """
-        fig, ax = plt.subplots(figsize=(5, 10))
-        ax.set_xlabel("Longitude (degrees)")
-        ax.set_ylabel("Latitude (degrees)")
-        ax.set_title("Railway Network")
-
-        COLOURS = ["b", "r", "g", "c", "m", "y", "k"]
-        MARKERS = [".", "o", "x", "*", "+"]
-
-        for i, r in enumerate(self.regions):
-            lats = [s.lat for s in self.stations.values() if s.region == r]
-            lons = [s.lon for s in self.stations.values() if s.region == r]
-
-            colour = COLOURS[i % len(COLOURS)]
-            marker = MARKERS[i % len(MARKERS)]
-            ax.scatter(lons, lats, s=marker_size, c=colour, marker=marker, label=r)
-
-        ax.legend()
-        plt.tight_layout()
-        plt.show()
-        return
+        from plotting import plot_network
+        plot_network(self, marker_size)
 
     def plot_journey(self, start: str, dest: str) -> None:
         """
@@ -257,33 +1126,68 @@ class RailNetwork: #brings together all the stations from a dataset
         This function will not successfully execute until you have written the journey_planner method.
         You are NOT required to write tests nor documentation for this function.
         """
-        # Plot railway network in the background
-        network_lats = [s.lat for s in self.stations.values()]
-        network_lons = [s.lon for s in self.stations.values()]
+        from plotting import plot_journey
+        plot_journey(self, start, dest)
+
+class FrozenRailNetwork(RailNetwork):
+    """
+    Immutable RailNetwork, safe to share between threads. It is usually made with RailNetwork.freeze, but
+    the constructor, from_columns and load_snapshot also build frozen networks when called on this class.
 
-        fig, ax = plt.subplots(figsize=(5, 10))
-        ax.scatter(network_lons, network_lats, s=1, c="blue", marker="x")
-        ax.set_xlabel("Longitude (degrees)")
-        ax.set_ylabel("Latitude (degrees)")
+    Its arrays can't be written, its stations are FrozenStation views, and the methods that would change
+    the network, its distance mode, journey cache or instrumentation raise FrozenNetworkError. Queries
+    keep no state of their own: the only structures built after freezing are the station views, which two
+    threads may both create for the same row, and the hub router of cheapest_journey, which is built once
+    under a lock since it is too costly to build for every network up front.
+    """
+    _station_type = FrozenStation
 
-        # Compute the journey
-        journey = self.journey_planner(start, dest)
-        plot_title = f"Journey from {journey[0].name} to {journey[-1].name}"
-        ax.set_title(f"Journey from {journey[0].name} to {journey[-1].name}")
+    def _read_only(self, *args, **kwargs):
+        raise FrozenNetworkError("A frozen network can't be changed.")
 
-        # Draw over the network with the journey
-        journey_lats = [s.lat for s in journey]
-        journey_lons = [s.lon for s in journey]
-        ax.plot(journey_lons, journey_lats, "ro-", markersize=2)
+    add_station = remove_station = set_hub = update_location = _read_only
+    set_distance_mode = enable_cache = enable_instrumentation = _read_only
 
-        plt.show()
-        return
+    def __init__(self, stations):
+        super().__init__(stations)
+        self._seal()
 
+    @classmethod
+    def from_columns(cls, *args, **kwargs):
+        network = super().from_columns(*args, **kwargs)
+        network._seal()
+        return network
 
-if __name__ == "__main__":
-    from utilities import read_rail_network     # Import read_rail_network function from utilities only when needed   
+    @classmethod
+    def load_snapshot(cls, *args, **kwargs):
+        network = super().load_snapshot(*args, **kwargs)
+        network._seal()
+        return network
 
-    #Required code is ran here
+    def _seal(self):
+        # Makes a newly built network read-only and builds what its queries would otherwise build lazily
+        for name in self._SHARED:
+            getattr(self, name).flags.writeable = False
+        for rows in self._region_rows + self._region_hubs:
+            rows.flags.writeable = False
+        self._objects = [None] * len(self._names)   # FrozenStation views, not the stations it was built from
+        self._spatial_index()
+        self._lock = threading.Lock()
 
-    
+    def freeze(self):
+        return self
 
+    def cheapest_journey(self, start, dest):
+        if self._router is None:
+            with self._lock:
+                if self._router is None:
+                    from routing import HubRouter
+                    self._router = HubRouter(self)
+        return super().cheapest_journey(start, dest)
+
+
+if __name__ == "__main__":
+    from batch_fares import main     # Import the batch fare command line only when needed
+
+    #Required code is ran here
+    main()
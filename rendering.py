@@ -0,0 +1,246 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.image import imsave
+from railway import RailNetwork
+from utilities import add_network_arguments, load_network
+
+class BatchRenderer:
+    """
+    Headless (Agg) renderer for many fare histograms or journey maps of a network.
+
+    Unlike the plot_* methods of RailNetwork, which build a new pyplot figure per plot, a renderer
+    keeps one figure per kind of plot and only updates the artists that change between frames.
+    Journey maps draw the network once as a background and blit each route on top of it.
+    """
+    def __init__(self, network, figsize=(6.4, 4.8), dpi=100):
+        self.network = network
+        self.figsize = figsize
+        self.dpi = dpi
+        self._histogram = None
+        self._map = None
+
+    def fare_histograms(self, out_dir, destinations=None, bins=10, block_size=256, shared_axes=False):
+        """
+        Saves a histogram of the fares from every other station to each destination (all stations when
+        destinations is None) as out_dir/Fare_prices_to_<CRS>.png. The fares of block_size destinations
+        are computed together with RailNetwork.fare_matrix and binned with np.histogram; journeys that
+        can't be planned are left out, as in plot_fares_to. Returns the paths written.
+
+        With shared_axes=True every histogram uses the same bins and axis limits, which makes them
+        comparable and lets the axes be drawn once and only the bars be redrawn for each destination.
+        """
+        rows = self._destination_rows(destinations)
+        if shared_axes:
+            counts, edges = self.shared_histograms(rows, bins, block_size)
+            return self.draw_shared_histograms(out_dir, rows, counts, edges)
+        paths = []
+        for (row, fares) in self._fares_to(rows, block_size):
+            counts, edges = np.histogram(fares, bins=bins)
+            title, path = self._histogram_labels(out_dir, row)
+            self.draw_histogram(counts, edges, title, path)
+            paths.append(path)
+        return paths
+
+    def shared_histograms(self, rows, bins=10, block_size=256):
+        """
+        Fare histograms of the destination rows on common bins: bins can be the bin edges, or a number of
+        bins spread over the range of all the fares (which are then computed twice, once to find it).
+        Returns the (destinations, bins) array of counts and the bin edges.
+        """
+        edges = np.asarray(bins, dtype=np.float64)
+        if edges.ndim == 0:
+            low, high = np.inf, -np.inf
+            for _, fares in self._fares_to(rows, block_size):
+                if fares.size:
+                    low, high = min(low, fares.min()), max(high, fares.max())
+            edges = np.histogram_bin_edges([], int(bins), (low, high) if low <= high else None)
+        counts = np.array([np.histogram(fares, edges)[0] for _, fares in self._fares_to(rows, block_size)])
+        return counts.reshape(len(rows), edges.size - 1), edges
+
+    def draw_shared_histograms(self, out_dir, rows, counts, edges, y_max=None):
+        """
+        Saves the histograms from shared_histograms, drawing the axes once and blitting only the bars and
+        title of each destination. The y axis goes up to y_max (the largest count when None).
+        """
+        figure, ax, bars = self._histogram_figure()
+        ax.set_xlim(edges[0], edges[-1])
+        ax.set_ylim(0, (y_max or max(counts.max(initial=0), 1)) * 1.05)
+        for artist in (bars, ax.title):
+            artist.set_animated(True)
+        ax.set_title(" ")
+        figure.canvas.draw()
+        background = figure.canvas.copy_from_bbox(figure.bbox)
+        paths = []
+        try:
+            for row, frame in zip(np.asarray(rows).tolist(), counts):
+                title, path = self._histogram_labels(out_dir, row)
+                bars.set_data(frame, edges)
+                ax.title.set_text(title)
+                _blit(figure.canvas, background, ax, (bars, ax.title), path)
+                paths.append(path)
+        finally:
+            self._histogram = None   # the figure now has fixed limits and animated artists
+        return paths
+
+    def _destination_rows(self, destinations):
+        network = self.network
+        return np.arange(network.n_stations()) if destinations is None else network._rows(destinations)
+
+    def _histogram_labels(self, out_dir, row):
+        # Title and file of the histogram of a destination
+        network = self.network
+        return f"Fare Prices to {network._names[row].replace(' ', '_')}", os.path.join(out_dir, f"Fare_prices_to_{network._crs[row]}.png")
+
+    def _fares_to(self, rows, block_size):
+        # Yields each destination row with the fares to it from every other station that can reach it
+        for first in range(0, rows.size, block_size):
+            block = rows[first:first + block_size]
+            fares = self.network.fare_matrix(None, block)
+            for column, row in enumerate(block.tolist()):
+                values = fares[:, column]
+                keep = ~np.isnan(values)
+                keep[row] = False
+                yield row, values[keep]
+
+    def _histogram_figure(self):
+        if self._histogram is None:
+            figure = Figure(figsize=self.figsize, dpi=self.dpi)
+            FigureCanvasAgg(figure)
+            ax = figure.add_subplot()
+            ax.set_xlabel("Fare Price (£-GBP)")
+            ax.set_ylabel("Frequency")
+            bars = ax.stairs(np.zeros(1), [0, 1], fill=True)
+            self._histogram = (figure, ax, bars)
+        return self._histogram
+
+    def draw_histogram(self, counts, edges, title, path):
+        """Draws one histogram from np.histogram output on the shared figure and saves it to path."""
+        figure, ax, bars = self._histogram_figure()
+        bars.set_data(counts, edges)
+        if edges[-1] > edges[0]:
+            ax.set_xlim(edges[0], edges[-1])
+        else:
+            ax.set_xlim(edges[0] - 0.5, edges[0] + 0.5)   # every fare is the same
+        ax.set_ylim(0, max(counts.max(initial=0), 1) * 1.05)
+        ax.set_title(title)
+        figure.savefig(path)
+
+    def journeys(self, out_dir, starts, dests):
+        """
+        Saves a map of each journey_planner route from starts[i] to dests[i] over the network as
+        out_dir/Journey_<start>_to_<dest>.png. The routes are planned together with plan_batch.
+        Returns the paths written, with None for journeys that can't be planned.
+        """
+        network = self.network
+        routes, n_legs = network.plan_batch(starts, dests)
+        paths = []
+        for route, legs in zip(routes.tolist(), n_legs.tolist()):
+            if legs == 0:
+                paths.append(None)
+                continue
+            route = route[:legs + 1]
+            path = os.path.join(out_dir, f"Journey_{network._crs[route[0]]}_to_{network._crs[route[-1]]}.png")
+            self.draw_journey(route, f"Journey from {network._names[route[0]]} to {network._names[route[-1]]}", path)
+            paths.append(path)
+        return paths
+
+    def draw_journey(self, route, title, path):
+        """Draws a route, given as station rows, over the network background and saves it to path."""
+        network = self.network
+        if self._map is None:
+            figure = Figure(figsize=(5, 10), dpi=self.dpi)
+            canvas = FigureCanvasAgg(figure)
+            ax = figure.add_subplot()
+            ax.scatter(network._lon, network._lat, s=1, c="blue", marker="x")
+            ax.set_xlabel("Longitude (degrees)")
+            ax.set_ylabel("Latitude (degrees)")
+            # Leave room for the longest title while the background is drawn without one
+            heading = ax.set_title(" ")
+            line, = ax.plot([], [], "ro-", markersize=2, animated=True)
+            heading.set_animated(True)
+            figure.tight_layout()
+            canvas.draw()
+            self._map = (canvas, ax, canvas.copy_from_bbox(figure.bbox), line, heading)
+        canvas, ax, background, line, heading = self._map
+        line.set_data(network._lon[route], network._lat[route])
+        heading.set_text(title)
+        _blit(canvas, background, ax, (line, heading), path)
+
+def _blit(canvas, background, ax, artists, path):
+    # Saves the pre-drawn background with only the given artists drawn over it
+    canvas.restore_region(background)
+    for artist in artists:
+        ax.draw_artist(artist)
+    imsave(path, np.asarray(canvas.buffer_rgba()))
+
+def _render_histograms(snapshot, out_dir, rows, bins, figsize, dpi):
+    network = RailNetwork.load_snapshot(snapshot, mmap=True, verify=False)
+    return BatchRenderer(network, figsize, dpi).fare_histograms(out_dir, rows, bins)
+
+def _draw_shared_histograms(snapshot, out_dir, rows, counts, edges, y_max, figsize, dpi):
+    network = RailNetwork.load_snapshot(snapshot, mmap=True, verify=False)
+    return BatchRenderer(network, figsize, dpi).draw_shared_histograms(out_dir, rows, counts, edges, y_max)
+
+def render_fare_histograms(network, out_dir, destinations=None, bins=10, shared_axes=False, workers=1,
+                           figsize=(6.4, 4.8), dpi=100):
+    """
+    Renders the fare histogram of every destination (see BatchRenderer.fare_histograms) into out_dir.
+    With workers > 1 (or None for one per CPU) the destinations are split between processes, which map a
+    snapshot of the network instead of receiving it pickled. With shared_axes the histograms are
+    computed here first, so every process draws them on the same axes. Returns the paths written, in
+    destination order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    renderer = BatchRenderer(network, figsize, dpi)
+    if workers == 1:
+        return renderer.fare_histograms(out_dir, destinations, bins, shared_axes=shared_axes)
+
+    rows = renderer._destination_rows(destinations)
+    workers = workers or os.cpu_count()
+    chunks = [chunk for chunk in np.array_split(np.arange(rows.size), workers) if chunk.size]
+    if shared_axes:
+        counts, edges = renderer.shared_histograms(rows, bins)
+        y_max = max(counts.max(initial=0), 1)
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, "network.railsnap")
+        network.save_snapshot(snapshot)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            if shared_axes:
+                futures = [pool.submit(_draw_shared_histograms, snapshot, out_dir, rows[chunk], counts[chunk], edges,
+                                       y_max, figsize, dpi) for chunk in chunks]
+            else:
+                futures = [pool.submit(_render_histograms, snapshot, out_dir, rows[chunk], bins, figsize, dpi)
+                           for chunk in chunks]
+            return [path for future in futures for path in future.result()]
+
+def render_journeys(network, out_dir, starts, dests, dpi=100):
+    """Renders a map of each journey from starts[i] to dests[i] into out_dir (see BatchRenderer.journeys)."""
+    os.makedirs(out_dir, exist_ok=True)
+    return BatchRenderer(network, dpi=dpi).journeys(out_dir, starts, dests)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the fare histogram of every station to PNG files.")
+    parser.add_argument("out_dir", help="directory to write the histograms to")
+    add_network_arguments(parser)
+    parser.add_argument("--destinations", nargs="*", help="CRS codes of the destinations (default: every station)")
+    parser.add_argument("--bins", type=int, default=10)
+    parser.add_argument("--shared-axes", action="store_true", help="draw every histogram on the same bins and axes")
+    parser.add_argument("--workers", type=int, default=1, help="processes to render with (0: one per CPU)")
+    args = parser.parse_args(argv)
+
+    network = load_network(args)
+
+    start = time.perf_counter()
+    paths = render_fare_histograms(network, args.out_dir, args.destinations, args.bins, args.shared_axes, args.workers or None)
+    print(f"{len(paths)} histograms in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import numpy as np
+from railway import Nohub_InRegionError, fare_price
+
+class HubRouter:
+    """
+    Cheapest-fare routing over the graph of a rail network in which every station is linked to the hubs
+    of its region and every hub is linked to every other hub, each link priced with fare_price. Stations
+    that aren't hubs are only ever the ends of a route, never stops along it.
+
+    The cheapest fares between all pairs of hubs are precomputed (Floyd-Warshall, cubic in the number of
+    hubs, so meant for networks with up to a few thousand hubs). A query then only adds the local legs
+    from the start to the hubs of its region and from the hubs of the destination region to the
+    destination, plus the direct journey when both ends are in the same region.
+    """
+    def __init__(self, network):
+        self.network = network
+        self.hubs = np.flatnonzero(network._hub)
+        self._position = np.full(len(network._hub), -1, dtype=np.intp)
+        self._position[self.hubs] = np.arange(self.hubs.size)
+
+        table = self._leg_fares(self.hubs[:, None], self.hubs[None, :])
+        np.fill_diagonal(table, 0.0)
+        # next_hop[i, j] is the hub after i on the cheapest route from hub i to hub j
+        next_hop = np.broadcast_to(np.arange(self.hubs.size), table.shape).copy()
+        for k in range(self.hubs.size):
+            via = table[:, k, None] + table[None, k, :]
+            better = via < table
+            table = np.where(better, via, table)
+            next_hop = np.where(better, next_hop[:, k, None], next_hop)
+        self.table = table
+        self._next_hop = next_hop
+
+    def _leg_fares(self, rows_a, rows_b):
+        # Fares of single legs from rows_a to rows_b (broadcast like NumPy arrays)
+        network = self.network
+        region_a = network._region_codes[rows_a]
+        region_b = network._region_codes[rows_b]
+        return fare_price(network._distances(rows_a, rows_b), region_a != region_b, network._region_hub_counts[region_b])
+
+    def _hub_path(self, i, j):
+        # Hub rows along the cheapest route from hub position i to hub position j
+        path = [i]
+        while i != j:
+            i = self._next_hop[i, j]
+            path.append(i)
+        return self.hubs[path].tolist()
+
+    def route(self, start_row, dest_row):
+        """
+        Cheapest route between two station rows: the list of station rows along it and its fare,
+        summed leg by leg in route order. Raises Nohub_InRegionError when the only routes need a hub
+        the start or destination region doesn't have.
+        """
+        network = self.network
+        if start_row == dest_row:
+            # Priced as the single zero-length leg journey_planner gives, never as an empty route
+            return [start_row, dest_row], float(self._leg_fares(start_row, dest_row))
+        same_region = network._region_codes[start_row] == network._region_codes[dest_row]
+        best_route, best_fare = None, np.inf
+        if same_region:
+            best_route, best_fare = [start_row, dest_row], float(self._leg_fares(start_row, dest_row))
+
+        first_hubs, access = self._local_legs(start_row, outbound=True)
+        last_hubs, egress = self._local_legs(dest_row, outbound=False)
+        if first_hubs.size and last_hubs.size:
+            totals = access[:, None] + self.table[np.ix_(self._position[first_hubs], self._position[last_hubs])] + egress[None, :]
+            i, j = np.unravel_index(np.argmin(totals), totals.shape)
+            if totals[i, j] < best_fare:
+                route = self._hub_path(self._position[first_hubs[i]], self._position[last_hubs[j]])
+                if not network._hub[start_row]:
+                    route.insert(0, start_row)
+                if not network._hub[dest_row]:
+                    route.append(dest_row)
+                best_route, best_fare = route, self.route_fare(route)
+
+        if best_route is None:
+            empty = start_row if first_hubs.size == 0 else dest_row
+            raise Nohub_InRegionError(f"No hub stations in the region: {network._region_names[network._region_codes[empty]]}")
+        return best_route, best_fare
+
+    def _local_legs(self, row, outbound):
+        # Hubs a route can enter the hub network through at a station, with the fares of the legs to (or from) them
+        network = self.network
+        if network._hub[row]:
+            return np.array([row]), np.zeros(1)
+        hubs = network._region_hubs[network._region_codes[row]]
+        return hubs, self._leg_fares(row, hubs) if outbound else self._leg_fares(hubs, row)
+
+    def route_fare(self, route):
+        """Fare of a route given as station rows, summing its legs in order like journey_fare."""
+        rows = np.asarray(route)
+        return float(sum(self._leg_fares(rows[:-1], rows[1:]).tolist(), 0.0)) if rows.size > 1 else 0.0
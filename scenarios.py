@@ -0,0 +1,205 @@
+import numpy as np
+from railway import fare_price, invalidCRS
+
+class HubScenarios:
+    """
+    What-if analysis of hub changes on the fares of every journey in a network.
+
+    The fare matrix of the network is computed once. A scenario toggles the hub flag of some stations
+    and only recomputes the fares that can change: those of journeys starting or ending in a region
+    whose hubs changed (journeys within such a region go direct and keep their fare). The fares are
+    rebuilt from their legs, the local legs to and from the closest hubs and the hub-to-hub leg, summed
+    in the same order as journey_fare, so they are exactly the fares the changed network would give.
+
+    The network itself is never modified, and it must not change while the scenarios are in use.
+    Memory use is that of the full fare matrix, so this is meant for networks of a few thousand stations.
+    """
+    def __init__(self, network, percentiles=(10, 50, 90)):
+        self.network = network
+        self.percentiles = tuple(percentiles)
+        self.base = network.fare_matrix()
+        planned = ~np.isnan(self.base)
+        self._sorted = np.sort(self.base[planned])
+        regions = network._region_codes
+        self._region_sums = np.bincount(regions, np.nansum(self.base, axis=1), minlength=len(network._region_names))
+        self._region_counts = np.bincount(regions, planned.sum(axis=1), minlength=len(network._region_names))
+        self._access, self._egress = self._local_legs(network._hub, network._nearest_hub, np.arange(len(regions)),
+                                                      network._region_hub_counts)
+        self.summary = self._statistics(self._sorted.sum(), self._sorted.size, self._region_sums,
+                                        self._region_counts, [], [], self.percentiles)
+
+    def evaluate(self, toggles, percentiles=None):
+        """
+        Fare statistics of the network with the hub flag of the given stations flipped. toggles is a CRS
+        code, a collection of CRS codes or a dict of CRS code -> hub flag. Returns a dict with the mean fare,
+        the given percentiles (those of the constructor when None) and the number of journeys that can be
+        planned, each with its change from the current network ("mean_delta", "percentile_deltas" and
+        "planned_delta"), the mean change of the fares of journeys starting in each region whose fares
+        changed ("region_deltas") and the number of journeys whose fare changed.
+        """
+        network = self.network
+        percentiles = self.percentiles if percentiles is None else tuple(percentiles)
+        hub = network._hub.copy()
+        for crs, flag in self._toggles(toggles).items():
+            hub[network._index[crs]] = flag
+        regions = np.unique(network._region_codes[hub != network._hub])
+        rows = np.flatnonzero(np.isin(network._region_codes, regions))
+
+        # Only the fares from the affected rows to every station, and from every other station to them, change
+        outbound, inbound = self._scenario_fares(hub, regions, rows)
+        others = np.ones(len(hub), dtype=bool)
+        others[rows] = False
+        before = (self.base[rows], self.base[:, rows][others])
+        after = (outbound, inbound[others])
+
+        # Changes to the fare sum and number of planned journeys of every origin row, then of every region
+        row_sums = np.zeros(len(hub))
+        row_counts = np.zeros(len(hub), dtype=np.int64)
+        for selection, old, new in ((rows, before[0], after[0]), (others, before[1], after[1])):
+            row_sums[selection] = np.nansum(new, axis=1) - np.nansum(old, axis=1)
+            row_counts[selection] = np.count_nonzero(~np.isnan(new), axis=1) - np.count_nonzero(~np.isnan(old), axis=1)
+        codes = network._region_codes
+        region_sums = self._region_sums + np.bincount(codes, row_sums, minlength=self._region_sums.size)
+        region_counts = self._region_counts + np.bincount(codes, row_counts, minlength=self._region_counts.size)
+
+        old = np.concatenate([block.ravel() for block in before])
+        new = np.concatenate([block.ravel() for block in after])
+        removed = old[~np.isnan(old)]
+        added = new[~np.isnan(new)]
+        if percentiles:
+            removed, added = np.sort(removed), np.sort(added)
+        total = self._sorted.sum() - removed.sum() + added.sum()
+        count = self._sorted.size - removed.size + added.size
+        result = self._statistics(total, count, region_sums, region_counts, removed, added, percentiles)
+        region_means = result.pop("region_means")
+        result["mean_delta"] = result["mean"] - self.summary["mean"]
+        result["planned_delta"] = result["planned"] - self.summary["planned"]
+        result["percentile_deltas"] = {p: value - self._percentile(p, [], []) for p, value in result["percentiles"].items()}
+        result["region_deltas"] = {
+            network._region_names[code]: region_means[code] - self.summary["region_means"][code]
+            for code in np.flatnonzero((region_sums != self._region_sums) | (region_counts != self._region_counts)).tolist()
+        }
+        result["changed_journeys"] = int(np.count_nonzero((old != new) & ~(np.isnan(old) & np.isnan(new))))
+        return result
+
+    def rank(self, candidates, top=None):
+        """
+        Evaluates many scenarios (each given like the toggles of evaluate) without percentiles and returns
+        (candidate, result) pairs sorted by the change in mean fare, largest reduction first, keeping the
+        top best when given.
+        """
+        results = [(candidate, self.evaluate(candidate, percentiles=())) for candidate in candidates]
+        results.sort(key=lambda item: item[1]["mean_delta"])
+        return results[:top] if top is not None else results
+
+    def _toggles(self, toggles):
+        # CRS code -> new hub flag
+        if isinstance(toggles, str):
+            toggles = [toggles]
+        if not isinstance(toggles, dict):
+            toggles = {crs: None for crs in toggles}
+        flags = {}
+        for crs, flag in toggles.items():
+            if crs not in self.network._index:
+                raise invalidCRS(f"Station {crs} not found in the network.")
+            flags[crs] = not self.network._hub[self.network._index[crs]] if flag is None else bool(flag)
+        return flags
+
+    def _scenario_fares(self, hub, regions, rows):
+        # Fares from rows to every station and from every station to rows with the hub flags of the scenario,
+        # where rows are all the stations of the regions whose hubs changed
+        network = self.network
+        codes = network._region_codes
+        counts = np.bincount(codes[hub], minlength=len(network._region_names))
+        nearest = network._nearest_hub.copy()
+        nearest[hub] = np.flatnonzero(hub)
+        for code in regions.tolist():
+            region_rows = network._region_rows[code]
+            hubs = region_rows[hub[region_rows]]
+            others = region_rows[~hub[region_rows]]
+            if hubs.size == 0:
+                nearest[others] = -1
+            elif others.size:
+                nearest[others] = hubs[np.argmin(network._distances(others[:, None], hubs[None, :]), axis=1)]
+
+        # Journeys between regions go start -> gate -> gate -> end, where a station's gate is itself for hubs
+        # and its closest hub otherwise; only the local legs of the affected rows change
+        access, egress = self._access.copy(), self._egress.copy()
+        access[rows], egress[rows] = self._local_legs(hub, nearest, rows, counts)
+        gate = np.where(hub, np.arange(len(hub)), nearest)
+        hubs = np.flatnonzero(hub)
+        position = np.zeros(len(hub), dtype=np.intp)
+        position[hubs] = np.arange(hubs.size)
+        hub_legs = _leg_fares(network, hubs[:, None], hubs[None, :], counts)
+
+        def fares(starts, ends):
+            # Summed leg by leg in the same order as journey_fare; legs that a route skips add 0
+            start_gates, end_gates = gate[starts][:, None], gate[ends][None, :]
+            middle = hub_legs[position[np.maximum(start_gates, 0)], position[np.maximum(end_gates, 0)]]
+            middle[(start_gates < 0) | (end_gates < 0)] = np.nan
+            result = (access[starts][:, None] + middle) + egress[ends][None, :]
+            same = codes[starts][:, None] == codes[ends][None, :]
+            return np.where(same, self.base[np.ix_(starts, ends)], result)   # same-region journeys go direct
+
+        everyone = np.arange(len(hub))
+        return fares(rows, everyone), fares(everyone, rows)
+
+    def _local_legs(self, hub, nearest, rows, counts):
+        # Fares of the legs from each row to its closest hub and back (0 for hubs, NaN without a hub to go to)
+        access = np.zeros(rows.size)
+        egress = np.zeros(rows.size)
+        local = ~hub[rows] & (nearest[rows] >= 0)
+        access[local] = _leg_fares(self.network, rows[local], nearest[rows[local]], counts)
+        egress[local] = _leg_fares(self.network, nearest[rows[local]], rows[local], counts)
+        missing = ~hub[rows] & (nearest[rows] < 0)
+        access[missing] = np.nan
+        egress[missing] = np.nan
+        return access, egress
+
+    def _statistics(self, total, count, region_sums, region_counts, removed, added, percentiles):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            region_means = region_sums / region_counts
+        return {
+            "mean": total / count if count else np.nan,
+            "planned": int(count),
+            "percentiles": {p: self._percentile(p, removed, added) for p in percentiles},
+            "region_means": region_means,
+        }
+
+    def _percentile(self, p, removed, added):
+        # Percentile (linear interpolation, like np.percentile) of the base fares with removed taken out and
+        # added put in, found by order statistics over the sorted arrays instead of sorting them together
+        count = self._sorted.size - len(removed) + len(added)
+        if count == 0:
+            return np.nan
+        position = p / 100 * (count - 1)
+        low = int(np.floor(position))
+        lower = self._order_statistic(low, removed, added)
+        if position == low:
+            return lower
+        upper = self._order_statistic(low + 1, removed, added)
+        return lower + (upper - lower) * (position - low)
+
+    def _order_statistic(self, k, removed, added):
+        # The k-th smallest (from 0) of the base fares with removed taken out and added put in
+        def at_most(value):
+            return (np.searchsorted(self._sorted, value, "right") - np.searchsorted(removed, value, "right")
+                    + np.searchsorted(added, value, "right"))
+
+        best = np.inf
+        for values in (self._sorted, added):
+            low, high = 0, len(values)
+            while low < high:
+                middle = (low + high) // 2
+                if at_most(values[middle]) > k:
+                    high = middle
+                else:
+                    low = middle + 1
+            if low < len(values):
+                best = min(best, values[low])
+        return float(best)
+
+def _leg_fares(network, starts, ends, counts):
+    # Fares of single legs (broadcast like NumPy arrays) with the given number of hubs in each region
+    codes = network._region_codes
+    return fare_price(network._distances(starts, ends), codes[starts] != codes[ends], counts[codes[ends]])
@@ -0,0 +1,126 @@
+import json
+import mmap as mmap_module
+import os
+import struct
+import zlib
+import numpy as np
+
+MAGIC = b"RAILSNAP"
+FORMAT_VERSION = 1
+ALIGNMENT = 64   # every array starts on a 64-byte boundary so it can be used straight from the mapped file
+
+# magic, format version, header length, CRC32 of everything after the prefix, padding
+PREFIX = struct.Struct("<8sIIII")
+
+class SnapshotError(Exception):
+    """Exception raised when a snapshot file is not a snapshot, was written by another format version or is corrupt."""
+    pass
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write_snapshot(path, state):
+    """
+    Writes a dict of arrays to a snapshot file.
+    Values can be NumPy arrays, lists of strings (stored as one NUL-separated UTF-8 text block) or lists
+    of 1-D arrays (stored concatenated plus bounds). The file is written under a temporary name and moved
+    into place, so readers never see a half-written snapshot.
+    """
+    kinds = {}
+    blocks = {}
+    for key, value in state.items():
+        if isinstance(value, np.ndarray):
+            kinds[key] = "array"
+            blocks[key] = value
+        elif all(isinstance(item, str) for item in value):
+            text = "\0".join(value)
+            if text.count("\0") != max(len(value) - 1, 0):
+                raise ValueError(f"Strings stored in a snapshot can't contain NUL characters ({key})")
+            kinds[key] = "strings" if value else "empty"
+            blocks[key + ".text"] = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        else:
+            kinds[key] = "groups"
+            blocks[key + ".data"] = np.concatenate(value) if value else np.empty(0, dtype=np.intp)
+            blocks[key + ".bounds"] = np.cumsum([0] + [len(item) for item in value], dtype=np.int64)
+
+    # Lay the arrays out after the header; the header size depends on the offsets, so iterate until stable
+    layout = {}
+    header = b""
+    while True:
+        offset = _aligned(PREFIX.size + len(header))
+        for name, block in blocks.items():
+            layout[name] = [block.dtype.str, list(block.shape), offset]
+            offset = _aligned(offset + block.nbytes)
+        new_header = json.dumps({"kinds": kinds, "blocks": layout, "size": offset}).encode("utf-8")
+        if new_header == header:
+            break
+        header = new_header
+
+    temporary = f"{path}.tmp{os.getpid()}"
+    with open(temporary, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(header), 0, 0))
+        checksum = zlib.crc32(header)
+        f.write(header)
+        position = PREFIX.size + len(header)
+        for name, block in blocks.items():
+            padding = b"\0" * (layout[name][2] - position)
+            data = np.ascontiguousarray(block).tobytes()
+            checksum = zlib.crc32(data, zlib.crc32(padding, checksum))
+            f.write(padding)
+            f.write(data)
+            position = layout[name][2] + len(data)
+        padding = b"\0" * (offset - position)
+        checksum = zlib.crc32(padding, checksum)
+        f.write(padding)
+        f.seek(0)
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(header), checksum, 0))
+    os.replace(temporary, path)
+
+def read_snapshot(path, mmap=True, verify=True):
+    """
+    Reads a snapshot written by write_snapshot back into a dict.
+    With mmap=True the arrays are read-only views of the memory-mapped file, so processes loading the
+    same snapshot share its pages; otherwise they are private, writable copies. The format version is
+    always checked, and with verify=True so is the CRC32 checksum of the contents.
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(PREFIX.size)
+        if len(prefix) < PREFIX.size or prefix[:len(MAGIC)] != MAGIC:
+            raise SnapshotError(f"{path} is not a rail network snapshot")
+        _, version, header_length, checksum, _ = PREFIX.unpack(prefix)
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} uses snapshot format version {version}, expected {FORMAT_VERSION}")
+        if mmap:
+            buffer = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+        else:
+            f.seek(0)
+            buffer = f.read()
+
+    contents = memoryview(buffer)[PREFIX.size:]
+    if verify and zlib.crc32(contents) != checksum:
+        raise SnapshotError(f"{path} is corrupt: checksum mismatch")
+    try:
+        header = json.loads(bytes(contents[:header_length]))
+        if header["size"] != len(buffer):
+            raise ValueError("unexpected file size")
+    except (ValueError, KeyError) as e:
+        raise SnapshotError(f"{path} is corrupt: {e}") from None
+
+    def block(name):
+        dtype, shape, offset = header["blocks"][name]
+        array = np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        return array if mmap else array.copy()
+
+    state = {}
+    for key, kind in header["kinds"].items():
+        if kind == "array":
+            state[key] = block(key)
+        elif kind == "strings":
+            state[key] = block(key + ".text").tobytes().decode("utf-8").split("\0")
+        elif kind == "empty":
+            state[key] = []
+        else:
+            data = block(key + ".data")
+            bounds = block(key + ".bounds")
+            state[key] = [data[start:end] for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+    return state
@@ -0,0 +1,140 @@
+from functools import lru_cache
+import numpy as np
+
+def unit_vectors(lat, lon):
+    """3D unit-sphere coordinates of points whose latitude/longitude are given in radians, shape (N, 3)."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+def chord_length(distance, radius):
+    """Straight-line (chord) distance on the unit sphere matching a great-circle distance on a sphere of the given radius."""
+    return 2 * np.sin(np.minimum(np.asarray(distance, dtype=np.float64) / radius, np.pi) / 2)
+
+@lru_cache(maxsize=64)
+def _block(radius):
+    # Offsets of every cell within Chebyshev distance radius of a cell
+    span = np.arange(-radius, radius + 1)
+    return np.stack(np.meshgrid(span, span, span, indexing="ij"), axis=-1).reshape(-1, 3)
+
+class SpatialGrid:
+    """
+    Uniform grid over the 3D unit-sphere coordinates of a set of points.
+
+    Points are bucketed into cubic cells of side cell_size and stored sorted by cell, so a query only
+    looks at the cells around it. Chord length is monotonic in great-circle distance, so the nearest
+    points by chord are also the nearest along the surface. Queries take and return rows into the
+    arrays the grid was built from.
+    """
+    def __init__(self, lat, lon, points_per_cell=4):
+        self.points = unit_vectors(lat, lon).reshape(-1, 3)
+        n = len(self.points)
+
+        # Pick the cell size so an occupied cell holds a handful of points; the points lie on a surface,
+        # so the area they cover is estimated from the two largest extents of their bounding box
+        extents = np.sort(np.ptp(self.points, axis=0))[::-1] if n else np.zeros(3)
+        area = max(extents[0] * extents[1], 1e-12)
+        self.cell_size = float(np.clip(np.sqrt(area * points_per_cell / max(n, 1)), 2e-6, 2.0))
+
+        # Cells are encoded into a single integer key: cell coordinates are offset to be non-negative
+        self._offset = int(np.ceil(1 / self.cell_size)) + 1
+        self._base = 2 * self._offset + 1
+        keys = self._keys(self._cells(self.points))
+        self.order = np.argsort(keys, kind="stable")
+        self.cell_keys, self.cell_starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.cell_ends = self.cell_starts + counts
+        self._low = self.points.min(axis=0) if n else np.zeros(3)
+        self._high = self.points.max(axis=0) if n else np.zeros(3)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cells(self, points):
+        return np.floor(points / self.cell_size).astype(np.int64)
+
+    def _keys(self, cells):
+        cells = cells + self._offset
+        return (cells[..., 0] * self._base + cells[..., 1]) * self._base + cells[..., 2]
+
+    def _rows_in_cells(self, cells):
+        # Rows of every point stored in the given cells (cells outside the grid are simply empty)
+        inside = np.all((cells >= -self._offset) & (cells <= self._offset), axis=1)
+        keys = self._keys(cells[inside])
+        if keys.size == 0 or self.cell_keys.size == 0:
+            return np.empty(0, dtype=np.intp)
+        slots = np.minimum(np.searchsorted(self.cell_keys, keys), self.cell_keys.size - 1)
+        slots = slots[self.cell_keys[slots] == keys]
+        if slots.size == 0:
+            return np.empty(0, dtype=np.intp)
+        starts = self.cell_starts[slots]
+        lengths = self.cell_ends[slots] - starts
+        # Concatenate the ranges starts[i]:starts[i]+lengths[i] without a Python loop
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self.order[positions]
+
+    def nearest(self, lat, lon, k=1):
+        """Rows of the k points closest to the query point (radians), nearest first."""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        query = unit_vectors(lat, lon)
+        if self.cell_keys.size <= 8:
+            return self._closest(np.arange(len(self)), query, k)
+
+        centre = self._cells(query)
+        # Cells closer than the bounding box of the points are empty, so the search starts at its edge
+        gap = np.linalg.norm(np.maximum(np.maximum(self._low - query, query - self._high), 0))
+        radius = max(1, int(np.ceil(gap / (np.sqrt(3) * self.cell_size))))
+        while True:
+            if (2 * radius + 1) ** 3 > self.cell_keys.size:
+                # The block has more cells than there are occupied cells, scanning every point is cheaper
+                return self._closest(np.arange(len(self)), query, k)
+            rows = self._rows_in_cells(centre + _block(radius))
+            # Points outside the block are more than radius cells away from the query
+            if rows.size >= k:
+                best = self._closest(rows, query, k)
+                if np.linalg.norm(self.points[best[-1]] - query) <= radius * self.cell_size:
+                    return best
+            radius *= 2
+
+    def within(self, lat, lon, chord):
+        """Rows of every point within the given chord distance of the query point (radians), in row order."""
+        query = unit_vectors(lat, lon)
+        reach = int(np.ceil(chord / self.cell_size))
+        if (2 * reach + 1) ** 3 > self.cell_keys.size:
+            rows = np.arange(len(self))
+        else:
+            rows = self._rows_in_cells(self._cells(query) + _block(reach))
+        rows = rows[np.linalg.norm(self.points[rows] - query, axis=1) <= chord]
+        return np.sort(rows)
+
+    def neighbourhood(self, lat, lon):
+        """
+        Candidate neighbours of many query points (radians) at once: every point stored in the 27 cells
+        around each query. Returns (queries, rows) index arrays of the candidate pairs, grouped by query.
+        Any point closer than cell_size (as a chord) to a query is always among its candidates.
+        """
+        cells = self._cells(unit_vectors(lat, lon).reshape(-1, 3))
+        neighbours = (cells[:, None, :] + _block(1)[None, :, :]).reshape(-1, 3)
+        keys = self._keys(neighbours)
+        if self.cell_keys.size == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        slots = np.minimum(np.searchsorted(self.cell_keys, keys), self.cell_keys.size - 1)
+        hit = self.cell_keys[slots] == keys
+        slots = slots[hit]
+        queries = np.repeat(np.arange(len(cells)), 27)[hit]
+        starts = self.cell_starts[slots]
+        lengths = self.cell_ends[slots] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.repeat(queries, lengths), self.order[positions]
+
+    def _closest(self, rows, query, k):
+        # The k rows closest to the query, nearest first (ties broken by row order)
+        distances = np.linalg.norm(self.points[rows] - query, axis=1)
+        if rows.size > k:
+            # Only the rows up to the k-th smallest distance need sorting
+            keep = distances <= np.partition(distances, k - 1)[k - 1]
+            rows, distances = rows[keep], distances[keep]
+        order = np.lexsort((rows, distances))[:k]
+        return rows[order]
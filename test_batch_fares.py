@@ -0,0 +1,49 @@
+import io
+import json
+from batch_fares import stream_fares, main
+
+def test_stream_fares(rail_network):
+    queries = [
+        '{"start": "NHA", "dest": "NHB", "id": 7}',
+        '{"start": "HBA", "dest": "HBB"}',
+        '',
+        '{"start": "NHA", "dest": "NNN"}',
+        'not json',
+        '{"start": "NHA"}',
+        '{"start": "NHC", "dest": "HBA"}',
+        '{"start": "NHA", "dest": "HBA"}',
+    ]
+    out = io.StringIO()
+    counts = stream_fares(rail_network, queries, out, batch_size=3)
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+
+    assert counts == {"records": 7, "answered": 3, "errors": 4}
+    assert results[0] == {"id": 7, "start": "NHA", "dest": "NHB", "route": ["NHA", "HBA", "HBB", "NHB"],
+                          "fare": rail_network.journey_fare("NHA", "NHB")}
+    assert results[1]["route"] == ["HBA", "HBB"] and results[1]["fare"] == rail_network.journey_fare("HBA", "HBB")
+    assert results[2]["error"] == "invalidCRS"
+    assert results[3]["error"] == "invalidJSON" and results[3]["line"] == 5
+    assert results[4]["error"] == "invalidRequest"
+    assert results[5]["error"] == "Nohub_InRegionError" and results[5]["message"].endswith("Region C")
+    assert results[6]["route"] == ["NHA", "HBA"]
+
+def test_batch_fares_command_line(tmp_path, capsys, rail_network):
+    rail_network.save_snapshot(tmp_path / "network.railsnap")
+    (tmp_path / "queries.jsonl").write_text('{"start": "NHA", "dest": "HBB"}\n{"start": "ZZZ", "dest": "HBB"}\n')
+
+    assert main([str(tmp_path / "queries.jsonl"), "-o", str(tmp_path / "fares.jsonl"), "--snapshot", str(tmp_path / "network.railsnap")]) == 0
+    results = [json.loads(line) for line in (tmp_path / "fares.jsonl").read_text().splitlines()]
+    assert results[0]["route"] == ["NHA", "HBA", "HBB"]
+    assert results[1]["error"] == "invalidCRS"
+    assert "2 records (1 answered, 1 errors)" in capsys.readouterr().err
+
+def test_batch_fares_badly_encoded_line(tmp_path, capsys, rail_network):
+    rail_network.save_snapshot(tmp_path / "network.railsnap")
+    (tmp_path / "queries.jsonl").write_bytes(b'{"start": "NHA", "dest": "HBB"}\n\xff\xfe\n{"start": "HBA", "dest": "HBB"}\n')
+
+    assert main([str(tmp_path / "queries.jsonl"), "-o", str(tmp_path / "fares.jsonl"), "--snapshot", str(tmp_path / "network.railsnap")]) == 0
+    results = [json.loads(line) for line in (tmp_path / "fares.jsonl").read_text().splitlines()]
+    assert results[0]["route"] == ["NHA", "HBA", "HBB"]
+    assert results[1]["error"] == "invalidJSON" and results[1]["line"] == 2
+    assert results[2]["route"] == ["HBA", "HBB"]
+    assert "3 records (2 answered, 1 errors)" in capsys.readouterr().err
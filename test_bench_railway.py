@@ -0,0 +1,30 @@
+import json
+from bench_railway import compare, main, run_benchmarks, thread_scaling
+from utilities import synthetic_network
+
+def test_run_benchmarks():
+    results = run_benchmarks(sizes=[300], queries=20, repeat=1, only=["journey_planner", "plan_batch", "read_rail_network"])
+    assert set(results["results"]) == {"synthetic_network@300", "journey_planner@300", "plan_batch@300", "read_rail_network@300"}
+    plan_batch = results["results"]["plan_batch@300"]
+    assert plan_batch["ops"] == 20 and plan_batch["seconds"] > 0 and plan_batch["peak_bytes"] > 0
+    json.dumps(results)
+
+def test_compare():
+    baseline = {"results": {"a@10": {"seconds": 1.0}, "b@10": {"seconds": 1.0}, "c@10": {"seconds": 1.0}}}
+    results = {"results": {"a@10": {"seconds": 1.2}, "b@10": {"seconds": 2.0}, "c@10": {"seconds": 0.5}, "d@10": {"seconds": 9.0}}}
+    assert compare(results, baseline, threshold=0.25) == [("b@10", 1.0, 2.0, 2.0)]
+    assert [name for name, *_ in compare(results, baseline, threshold=0.1)] == ["b@10", "a@10"]
+
+def test_main_fails_on_regression(tmp_path):
+    output = tmp_path / "results.json"
+    arguments = ["--sizes", "200", "--queries", "10", "--repeat", "1", "--only", "plan_batch", "-o", str(output)]
+    assert main(arguments) == 0
+    baseline = json.loads(output.read_text())
+    baseline["results"]["plan_batch@200"]["seconds"] = 1e-12
+    (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+    assert main(arguments + ["--baseline", str(tmp_path / "baseline.json")]) == 1
+
+def test_thread_scaling():
+    results = thread_scaling(synthetic_network(300), threads=(1, 2), queries=20, repeat=1, only=["threaded_journey_fare"])
+    assert set(results) == {"threaded_journey_farex1", "threaded_journey_farex2"}
+    assert results["threaded_journey_farex1"]["speedup"] == 1.0 and results["threaded_journey_farex2"]["ops"] == 20
@@ -0,0 +1,32 @@
+import numpy as np
+from fare_matrix import compute_fare_matrix
+
+def test_compute_fare_matrix(tmp_path, regional_network):
+    expected = regional_network.fare_matrix()
+
+    matrix = compute_fare_matrix(regional_network, tmp_path / "fares.npy", workers=2, chunk_rows=3)
+    assert np.array_equal(matrix, expected, equal_nan=True)
+
+    single = compute_fare_matrix(regional_network, tmp_path / "fares32.npy", workers=1, chunk_rows=4, dtype=np.float32)
+    assert single.dtype == np.float32
+    assert np.allclose(single, expected, equal_nan=True)
+
+def test_compute_fare_matrix_resumes(tmp_path, regional_network):
+    out = tmp_path / "fares.npy"
+    compute_fare_matrix(regional_network, out, workers=1, chunk_rows=5)
+
+    # Pretend the run stopped after the first chunk: only the others are computed again
+    matrix = np.load(out, mmap_mode="r+")
+    matrix[:] = -1
+    matrix.flush()
+    progress = (tmp_path / "fares.npy.progress").read_text().splitlines()
+    (tmp_path / "fares.npy.progress").write_text("\n".join(progress[:2]) + "\n")
+
+    resumed = compute_fare_matrix(regional_network, out, workers=1, chunk_rows=5)
+    assert (resumed[:5] == -1).all()
+    assert np.array_equal(resumed[5:], regional_network.fare_matrix()[5:], equal_nan=True)
+
+    # Progress recorded for another network is ignored
+    regional_network.set_hub("SBA")
+    fresh = compute_fare_matrix(regional_network, out, workers=1, chunk_rows=5)
+    assert np.array_equal(fresh, regional_network.fare_matrix(), equal_nan=True)
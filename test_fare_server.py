@@ -0,0 +1,123 @@
+import asyncio
+import json
+from fare_server import FareServer
+
+async def exchange(port, lines):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write("".join(line + "\n" for line in lines).encode())
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in lines]
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+def test_fare_server_coalesces_queries(rail_network):
+    async def run():
+        fare_server = FareServer(rail_network, window=0.05)
+        server = await fare_server.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            lines = [json.dumps({"id": i, "start": start, "dest": dest}) for i, (start, dest) in
+                     enumerate([("NHA", "NHB"), ("HBA", "HBB"), ("NHA", "NHB"), ("NHA", "NNN")])]
+            lines.append("not json")
+            # Two clients at once: their queries end up in the same batch
+            first, second = await asyncio.gather(exchange(port, lines), exchange(port, lines[:2]))
+        return fare_server, first, second
+
+    fare_server, first, second = asyncio.run(run())
+    assert [response.get("id") for response in first] == [0, 1, 2, 3, None]
+    assert first[0]["route"] == ["NHA", "HBA", "HBB", "NHB"]
+    assert first[0]["fare"] == rail_network.journey_fare("NHA", "NHB")
+    assert first[2]["fare"] == first[0]["fare"]
+    assert first[3]["error"] == "invalidCRS"
+    assert first[4]["error"] == "invalidJSON"
+    assert second[1]["fare"] == rail_network.journey_fare("HBA", "HBB")
+    assert fare_server.stats == {"queries": 6, "batches": 1, "deduplicated": 3, "rejected": 0}
+
+def test_fare_server_back_pressure(rail_network):
+    async def run():
+        fare_server = FareServer(rail_network, window=0.05, max_pending=1)
+        return await asyncio.gather(fare_server.query("NHA", "NHB"), fare_server.query("NHA", "NHB"), fare_server.query("HBA", "HBB"))
+
+    first, duplicate, rejected = asyncio.run(run())
+    assert "fare" in first and duplicate == first
+    assert rejected["error"] == "overloaded"
+
+def test_fare_server_unix_socket(tmp_path, rail_network):
+    async def run():
+        server = await FareServer(rail_network, window=0).start(path=str(tmp_path / "fares.sock"))
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(str(tmp_path / "fares.sock"))
+            writer.write(b'{"start": "HBA", "dest": "NHB"}\n')
+            response = json.loads(await reader.readline())
+            writer.close()
+            await writer.wait_closed()
+        return response
+
+    assert asyncio.run(run())["route"] == ["HBA", "HBB", "NHB"]
+
+def test_fare_server_bad_lines(rail_network):
+    async def run():
+        server = await FareServer(rail_network, window=0).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b'{"start": "HBA", "dest": "HBB"}\n\xff\xfe\n' + b"x" * 100_000 + b'\n{"start": "HBA", "dest": "NHB"}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(4)]
+            writer.close()
+            await writer.wait_closed()
+        return responses
+
+    valid, undecodable, too_long, after = asyncio.run(run())
+    assert valid["route"] == ["HBA", "HBB"]
+    assert undecodable["error"] == "invalidJSON" and undecodable["line"] == 2
+    assert too_long["error"] == "invalidRequest" and too_long["line"] == 3
+    assert after["route"] == ["HBA", "HBB", "NHB"]
+
+def test_fare_server_client_reset(rail_network):
+    import socket
+    import struct
+
+    async def run():
+        server = await FareServer(rail_network, window=0.05, max_in_flight=2).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b'{"start": "NHA", "dest": "NHB"}\n' * 10)
+            await writer.drain()
+            await asyncio.sleep(0.01)
+            # Reset the connection instead of closing it, while the server still has responses to write
+            writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            writer.transport.abort()
+            await asyncio.sleep(0.5)
+            # The connection handler and the answers it was waiting on have all finished
+            return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+
+def test_fare_server_long_line_in_pieces(rail_network):
+    async def run():
+        server = await FareServer(rail_network, window=0).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b'{"start": "HBA", "dest": "HBB"}\n')
+            for _ in range(10):
+                writer.write(b"x" * 10_000)
+                await writer.drain()
+                await asyncio.sleep(0.01)
+            writer.write(b'\n{"start": "HBA", "dest": "NHB"}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(3)]
+            writer.write_eof()
+            extra = await reader.read()
+            writer.close()
+            await writer.wait_closed()
+        return responses, extra
+
+    (valid, too_long, after), extra = asyncio.run(run())
+    assert valid["route"] == ["HBA", "HBB"]
+    assert too_long["error"] == "invalidRequest" and too_long["line"] == 2
+    assert after["route"] == ["HBA", "HBB", "NHB"]
+    assert extra == b""   # exactly one response per request
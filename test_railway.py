@@ -1,6 +1,10 @@
 import pytest
 from railway import Station, RailNetwork, CRSDuplicateError, RegionnonExistentError, Nohub_InRegionError, invalidCRS, fare_price
+from railway import APPROX_MAX_RELATIVE_ERROR, equirectangular, haversine, FrozenNetworkError
 import re
+import subprocess
+import sys
+import json
 import numpy as np
 
 def test_fare_price():
@@ -229,4 +233,504 @@ def test_plot_fares_to_CRS():   #tests the validity of the CRS code given
     rail_network = RailNetwork(stations)
     with pytest.raises(invalidCRS) as e:
         rail_network.plot_fares_to("NNN")
-    assert isinstance(e.value, invalidCRS)
\ No newline at end of file
+    assert isinstance(e.value, invalidCRS)
+
+def test_station_is_slotted():
+    station = Station("Station A", "Region A", "STA", 0, 0, True)
+    assert not hasattr(station, "__dict__")
+    with pytest.raises(AttributeError):
+        station.platforms = 4
+
+def test_columnar_station_views():
+    station_a = Station("Station A", "Region A", "STA", 10, 20, True)
+    station_b = Station("Station B", "Region B", "STB", -10, -20, False)
+    rail_network = RailNetwork([station_a, station_b])
+
+    # Stations passed in are handed back unchanged
+    assert rail_network.stations["STA"] is station_a
+    assert list(rail_network.stations) == ["STA", "STB"]
+
+    # Rows without a Station object are materialised as views over the columns
+    rail_network._objects[1] = None
+    view = rail_network.stations["STB"]
+    assert (view.name, view.region, view.crs, view.lat, view.lon, view.hub) == ("Station B", "Region B", "STB", -10.0, -20.0, False)
+    assert rail_network.stations["STB"] is view
+    assert "STC" not in rail_network.stations
+
+def test_fare_matrix_matches_journey_fare():
+    non_hub_station_A = Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False)
+    hub_station_A = Station("Station A", "Region A", "HBA", 0, 1, True)
+    non_hub_station_B = Station("Non-Hub Station B", "Region B", "NHB", 0, 3, False)
+    hub_station_B = Station("Station B", "Region B", "HBB", 0, 5, True)
+    rail_network = RailNetwork([non_hub_station_A, hub_station_A, non_hub_station_B, hub_station_B])
+    codes = ["NHA", "HBA", "NHB", "HBB"]
+
+    expected = np.array([[rail_network.journey_fare(a, b) for b in codes] for a in codes])
+    assert np.array_equal(rail_network.fare_matrix(), expected)
+    assert np.array_equal(rail_network.fare_matrix(codes, codes, block_size=3), expected)
+    assert np.array_equal(rail_network.fare_matrix(["NHB"], ["HBA", "NHA"]), expected[[[2]], [[1, 0]]])
+    assert np.array_equal(rail_network.fares_to("NHB"), expected[:, 2])
+    assert np.array_equal(rail_network.fares_from("NHB"), expected[2])
+
+    with pytest.raises(invalidCRS):
+        rail_network.fares_to("NNN")
+
+def test_fare_matrix_unplannable_journeys():
+    hub_station_A = Station("Station A", "Region A", "HBA", 0, 1, True)
+    non_hub_station_A = Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False)
+    non_hub_station_C = Station("Non-Hub Station C", "Region C", "NHC", 0, 3, False)
+    rail_network = RailNetwork([hub_station_A, non_hub_station_A, non_hub_station_C])
+
+    with pytest.raises(Nohub_InRegionError):
+        rail_network.journey_fare("HBA", "NHC")
+    fares = rail_network.fares_to("NHC")
+    assert np.isnan(fares[:2]).all() and fares[2] == 1
+    fares = rail_network.fares_to("HBA")
+    assert not np.isnan(fares[:2]).any() and np.isnan(fares[2])
+
+def test_region_indexes():
+    stations = [
+        Station("Hub Station A", "Region A", "HBA", 0, 0, True),
+        Station("Non-Hub Station B", "Region B", "NHB", 0, 2, False),
+        Station("Non-Hub Station A", "Region A", "NHA", 0, 1, False),
+        Station("Hub Station B", "Region B", "HBB", 0, 3, True),
+        Station("Hub Station A2", "Region A", "HBC", 0, 4, True),
+    ]
+    rail_network = RailNetwork(stations)
+
+    assert rail_network.regions() == ["Region A", "Region B"]
+    assert [rows.tolist() for rows in rail_network._region_rows] == [[0, 2, 4], [1, 3]]
+    assert [rows.tolist() for rows in rail_network._region_hubs] == [[0, 4], [3]]
+    assert rail_network._region_hub_counts.tolist() == [2, 1]
+    assert rail_network.hub_stations("Region A") == [stations[0], stations[4]]
+
+    # The cached region list can't be changed through the returned copy
+    rail_network.regions().append("Region C")
+    assert len(rail_network.regions()) == 2
+
+def test_closest_hub_table_is_lazy_about_missing_hubs():
+    hub_station_A = Station("Station A", "Region A", "HBA", 0, 1, True)
+    non_hub_station_A = Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False)
+    far_hub_station_A = Station("Far Hub Station A", "Region A", "FHA", 10, 10, True)
+    non_hub_station_C = Station("Non-Hub Station C", "Region C", "NHC", 0, 3, False)
+    other_non_hub_station_C = Station("Other Non-Hub Station C", "Region C", "ONC", 0, 4, False)
+    rail_network = RailNetwork([hub_station_A, non_hub_station_A, far_hub_station_A, non_hub_station_C, other_non_hub_station_C])
+
+    assert rail_network._nearest_hub.tolist() == [0, 0, 2, -1, -1]
+    assert rail_network._nearest_hub_distance[1] == non_hub_station_A.distance_to(hub_station_A)
+    assert np.isnan(rail_network._nearest_hub_distance[3])
+
+    # Journeys that don't need a hub in Region C can still be planned
+    assert rail_network.journey_planner("NHC", "ONC") == [non_hub_station_C, other_non_hub_station_C]
+    with pytest.raises(Nohub_InRegionError):
+        rail_network.journey_planner("HBA", "NHC")
+
+def test_nearest_stations():
+    stations = [Station(f"Station {i}", "Region A", f"S{chr(65 + i)}A", 50 + 0.1 * i, -1 + 0.05 * i, i % 3 == 0) for i in range(20)]
+    rail_network = RailNetwork(stations)
+
+    nearest = rail_network.nearest_stations(50.52, -0.74, k=3)
+    by_distance = sorted(stations, key=lambda s: Station("Q", "Q", "QQQ", 50.52, -0.74, False).distance_to(s))
+    assert nearest == by_distance[:3]
+
+    rows, distances = rail_network.nearest_stations_bulk([50.0, 50.93], [-1.0, -0.54], k=2)
+    assert rows.shape == distances.shape == (2, 2)
+    assert rows[:, 0].tolist() == [0, 9]
+    assert distances[0, 0] == 0
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+    # Asking for more stations than exist returns all of them
+    assert len(rail_network.nearest_stations(0, 0, k=50)) == 20
+
+def test_stations_within():
+    stations = [Station(f"Station {i}", "Region A", f"S{chr(65 + i)}A", 50 + 0.1 * i, 0, False) for i in range(20)]
+    rail_network = RailNetwork(stations)
+
+    within = rail_network.stations_within("SFA", 25)
+    assert within[0] is stations[5]
+    assert set(within) == {s for s in stations if stations[5].distance_to(s) <= 25}
+    assert rail_network.stations_within((40.0, 0.0), 100) == []
+    assert len(rail_network.stations_within((51.0, 0.0), 20000)) == 20
+
+    with pytest.raises(invalidCRS):
+        rail_network.stations_within("NNN", 10)
+
+def test_plan_batch():
+    non_hub_station_A = Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False)
+    hub_station_A = Station("Station A", "Region A", "HBA", 0, 1, True)
+    non_hub_station_B = Station("Non-Hub Station B", "Region B", "NHB", 0, 3, False)
+    hub_station_B = Station("Station B", "Region B", "HBB", 0, 5, True)
+    non_hub_station_C = Station("Non-Hub Station C", "Region C", "NHC", 0, 7, False)
+    rail_network = RailNetwork([non_hub_station_A, hub_station_A, non_hub_station_B, hub_station_B, non_hub_station_C])
+
+    starts = ["NHA", "HBA", "HBA", "NHA", "NHA", "HBA"]
+    dests = ["HBA", "HBB", "NHB", "HBB", "NHB", "NHC"]
+    routes, n_legs, fares = rail_network.plan_batch(starts, dests, fares=True)
+
+    assert routes.dtype == np.int32
+    assert n_legs.tolist() == [1, 1, 2, 2, 3, 0]
+    assert routes.tolist() == [[0, 1, -1, -1], [1, 3, -1, -1], [1, 3, 2, -1], [0, 1, 3, -1], [0, 1, 3, 2], [-1, -1, -1, -1]]
+    for i in range(5):
+        assert fares[i] == rail_network.journey_fare(starts[i], dests[i])
+    assert np.isnan(fares[5])
+
+    # Row indices are accepted as well, and blocking doesn't change the result
+    routes_by_row, n_legs_by_row = rail_network.plan_batch([0, 1, 1, 0, 0, 1], [1, 3, 2, 3, 2, 4], block_size=4)
+    assert np.array_equal(routes_by_row, routes) and np.array_equal(n_legs_by_row, n_legs)
+
+    with pytest.raises(invalidCRS):
+        rail_network.plan_batch(["NHA"], ["NNN"])
+    with pytest.raises(invalidCRS):
+        rail_network.plan_batch([0], [9])
+    with pytest.raises(ValueError):
+        rail_network.plan_batch(["NHA", "HBA"], ["HBB"])
+
+def test_fare_cache():
+    non_hub_station_A = Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False)
+    hub_station_A = Station("Station A", "Region A", "HBA", 0, 1, True)
+    non_hub_station_B = Station("Non-Hub Station B", "Region B", "NHB", 0, 3, False)
+    hub_station_B = Station("Station B", "Region B", "HBB", 0, 5, True)
+    rail_network = RailNetwork([non_hub_station_A, hub_station_A, non_hub_station_B, hub_station_B])
+    assert rail_network.cache_info() is None
+
+    rail_network.enable_cache(maxsize=2)
+    assert rail_network.journey_planner("NHA", "NHB") == [non_hub_station_A, hub_station_A, hub_station_B, non_hub_station_B]
+    assert rail_network.journey_fare("NHA", "NHB") == 69.3599358909409   # route reused from the planner
+    assert rail_network.journey_fare("NHA", "NHB") == 69.3599358909409
+    assert rail_network.cache_info() == {"hits": 2, "misses": 1, "evictions": 0, "size": 1, "maxsize": 2}
+
+    # The least recently used journey is evicted
+    rail_network.journey_fare("HBA", "HBB")
+    rail_network.journey_fare("NHA", "HBB")
+    info = rail_network.cache_info()
+    assert (info["evictions"], info["size"]) == (1, 2)
+    rail_network.journey_fare("NHA", "NHB")
+    assert rail_network.cache_info()["misses"] == 4
+
+    # Invalidating a region only drops the journeys touching it
+    rail_network.journey_fare("NHA", "HBA")
+    rail_network.invalidate_cache(["Region B"])
+    assert rail_network.cache_info()["size"] == 1
+
+    # Errors are not cached
+    with pytest.raises(invalidCRS):
+        rail_network.journey_planner("NHA", "NNN")
+
+    with pytest.raises(ValueError):
+        rail_network.enable_cache(maxsize=0)
+
+def assert_same_network(rail_network, stations):
+    rebuilt = RailNetwork(stations)
+    assert list(rail_network.stations) == list(rebuilt.stations)
+    assert sorted(rail_network.regions()) == sorted(rebuilt.regions())
+    for region in rebuilt.regions():
+        assert [s.crs for s in rail_network.hub_stations(region)] == [s.crs for s in rebuilt.hub_stations(region)]
+    assert np.array_equal(rail_network._nearest_hub, rebuilt._nearest_hub)
+    assert np.array_equal(rail_network.fare_matrix(), rebuilt.fare_matrix(), equal_nan=True)
+    expected = rebuilt.fares_to("HBB")
+    for row, crs in enumerate(rebuilt.stations):
+        if not np.isnan(expected[row]):
+            assert rail_network.journey_fare(crs, "HBB") == expected[row]   # also checks the cached fares
+
+def test_network_mutation():
+    stations = [
+        Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False),
+        Station("Station A", "Region A", "HBA", 0, 1, True),
+        Station("Non-Hub Station B", "Region B", "NHB", 0, 3, False),
+        Station("Station B", "Region B", "HBB", 0, 5, True),
+        Station("Other Station B", "Region B", "OSB", 0, 2.5, False),
+    ]
+    rail_network = RailNetwork(list(stations))
+    rail_network.enable_cache()
+    assert_same_network(rail_network, stations)
+
+    # Adding a station, including one in a new region
+    new_hub = Station("New Hub B", "Region B", "NEB", 0, 2.9, True)
+    rail_network.add_station(new_hub)
+    stations.append(new_hub)
+    assert_same_network(rail_network, stations)
+    new_region = Station("Station C", "Region C", "STC", 0, 9, False)
+    rail_network.add_station(new_region)
+    stations.append(new_region)
+    assert_same_network(rail_network, stations)
+    with pytest.raises(CRSDuplicateError):
+        rail_network.add_station(Station("Station A", "Region A", "HBA", 1, 1, True))
+
+    # Promoting and demoting hubs
+    rail_network.set_hub("STC")
+    assert new_region.hub
+    assert_same_network(rail_network, stations)
+    rail_network.set_hub("NEB", False)
+    assert_same_network(rail_network, stations)
+
+    # Moving stations
+    rail_network.update_location("HBB", 0, 3.1)
+    assert (stations[3].lat, stations[3].lon) == (0, 3.1)
+    assert_same_network(rail_network, stations)
+    rail_network.update_location("OSB", 0, 4.9)
+    assert_same_network(rail_network, stations)
+    with pytest.raises(ValueError):
+        rail_network.update_location("OSB", 100, 0)
+
+    # Removing stations, emptying a region on the way
+    rail_network.remove_station("HBA")
+    del stations[1]
+    assert_same_network(rail_network, stations)
+    rail_network.remove_station("STC")
+    del stations[-1]
+    assert_same_network(rail_network, stations)
+    assert "Region C" not in rail_network.regions()
+    rail_network.remove_station("NHB")
+    del stations[1]
+    assert_same_network(rail_network, stations)
+
+    with pytest.raises(invalidCRS):
+        rail_network.remove_station("NNN")
+    with pytest.raises(invalidCRS):
+        rail_network.set_hub("NNN")
+
+def test_instrumentation():
+    non_hub_station_A = Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False)
+    hub_station_A = Station("Station A", "Region A", "HBA", 0, 1, True)
+    non_hub_station_B = Station("Non-Hub Station B", "Region B", "NHB", 0, 3, False)
+    hub_station_B = Station("Station B", "Region B", "HBB", 0, 5, True)
+    non_hub_station_C = Station("Non-Hub Station C", "Region C", "NHC", 0, 7, False)
+    rail_network = RailNetwork([non_hub_station_A, hub_station_A, non_hub_station_B, hub_station_B, non_hub_station_C])
+    assert rail_network.instrumentation_snapshot() is None
+
+    stats = rail_network.enable_instrumentation()
+    rail_network.enable_cache()
+    rail_network.journey_fare("NHA", "NHB")
+    rail_network.journey_fare("NHA", "NHB")
+    rail_network.journey_planner("HBA", "HBB")
+    rail_network.closest_hub(Station("Elsewhere", "Region A", "ELS", 0, 2, False))
+    rail_network.plan_batch(["NHA", "NHA", "HBA", "NHC"], ["HBA", "HBB", "NHB", "NHA"], fares=True)
+    snapshot = rail_network.instrumentation_snapshot()
+    assert snapshot["counters"] == {
+        "cache_hits": 1, "cache_misses": 2,
+        "closest_hub_scan": 1, "closest_hub_table": 2,
+        "distance_evaluations": 3 + 1 + 5,   # journey legs, the scan over the hubs and the legs of the batch
+        "fares_computed": 1 + 3,
+        "planner_failed": 1, "planner_hub_hub": 1, "planner_hub_nonhub": 1, "planner_nonhub_hub": 1,
+        "planner_nonhub_nonhub": 1, "planner_same_region": 1,
+    }
+    assert snapshot["timers"]["journey_fare"]["calls"] == 2
+    assert snapshot["timers"]["closest_hub"]["calls"] == 3
+    assert snapshot["timers"]["plan_batch"]["seconds"] > 0
+
+    assert json.loads(stats.to_json()) == snapshot
+    prometheus = stats.to_prometheus()
+    assert 'railway_events_total{event="cache_hits"} 1' in prometheus
+    assert 'railway_calls_total{method="journey_fare"} 2' in prometheus
+    assert "# TYPE railway_call_seconds_total counter" in prometheus
+
+    rail_network.reset_instrumentation()
+    assert rail_network.instrumentation_snapshot() == {"counters": {}, "timers": {}}
+    rail_network.journey_fare("HBA", "HBB")   # still counted and timed after a reset
+    snapshot = rail_network.instrumentation_snapshot()
+    assert snapshot["timers"]["journey_fare"]["calls"] == 1 and snapshot["counters"]["cache_hits"] == 1
+    rail_network.disable_instrumentation()
+    assert "journey_fare" not in vars(rail_network)
+    rail_network.journey_fare("NHA", "HBB")
+    assert rail_network.instrumentation_snapshot() is None
+
+def run_import(*options):
+    # Imports railway in a fresh interpreter, so modules already loaded by the tests don't count
+    code = "import sys, railway; print('matplotlib' in sys.modules)"
+    return subprocess.run([sys.executable, *options, "-c", code], capture_output=True, text=True, check=True)
+
+def test_import_does_not_load_matplotlib():
+    assert run_import().stdout.strip() == "False"
+
+def test_import_time_budget():
+    # -X importtime reports "import time: self | cumulative | module" in microseconds
+    cumulative = {}
+    for line in run_import("-X", "importtime").stderr.splitlines()[1:]:
+        _, total, module = line.split("|")
+        cumulative[module.strip()] = int(total)
+    # Everything railway imports apart from NumPy, which every user of it needs anyway
+    assert cumulative["railway"] - cumulative["numpy"] < 100_000
+
+def test_equirectangular_error_bound():
+    from utilities import read_rail_network
+    rail_network = read_rail_network("uk_stations.csv")
+    i, j = np.triu_indices(rail_network.n_stations(), 1)
+    lat, lon = rail_network._lat_rad, rail_network._lon_rad
+    exact = haversine(lat[i], lon[i], lat[j], lon[j])
+    approx = equirectangular(lat[i], lon[i], lat[j], lon[j])
+    assert np.max(np.abs(approx - exact) / exact) < APPROX_MAX_RELATIVE_ERROR
+    assert np.array_equal(approx, equirectangular(lat[i], lon[i], lat[j], lon[j], np.sqrt(np.cos(lat[i])), np.sqrt(np.cos(lat[j]))))
+
+def test_approximate_distance_mode(tmp_path):
+    from utilities import read_rail_network
+    rail_network = read_rail_network("uk_stations.csv")
+    exact_fares = rail_network.fare_matrix(np.arange(0, 2395, 7))
+    exact_hubs = rail_network._nearest_hub.copy()
+    with pytest.raises(ValueError):
+        rail_network.set_distance_mode("fast")
+
+    rail_network.set_distance_mode("approx")
+    approx_fares = rail_network.fare_matrix(np.arange(0, 2395, 7))
+    assert np.array_equal(rail_network._nearest_hub, exact_hubs)
+    assert np.array_equal(np.isnan(approx_fares), np.isnan(exact_fares))
+    assert np.nanmax(np.abs(approx_fares - exact_fares) / exact_fares) < 1e-3
+    start, dest = rail_network._index["ABW"], rail_network._index["ABD"]
+    assert rail_network.journey_fare("ABW", "ABD") == rail_network.fare_matrix([start], [dest])[0, 0]
+
+    # Each leg's fare is off by at most (1 + hubs in the destination region / 10) times its distance error
+    legs = np.random.default_rng(0).integers(0, 2395, (2, 5000))
+    hubs = rail_network._region_hub_counts[rail_network._region_codes[legs[1]]]
+    different = rail_network._region_codes[legs[0]] != rail_network._region_codes[legs[1]]
+    approx = rail_network._distances(legs[0], legs[1])
+    rail_network.set_distance_mode("exact")
+    exact = rail_network._distances(legs[0], legs[1])
+    fare_error = np.abs(fare_price(approx, different, hubs) - fare_price(exact, different, hubs))
+    assert np.all(fare_error <= (1 + hubs / 10) * np.abs(approx - exact) + 1e-12)
+
+    # The mode is saved with the network
+    rail_network.set_distance_mode("approx")
+    rail_network.save_snapshot(tmp_path / "network.railsnap")
+    loaded = RailNetwork.load_snapshot(tmp_path / "network.railsnap")
+    assert loaded.journey_fare("ABW", "ABD") == rail_network.journey_fare("ABW", "ABD")
+
+def test_freeze():
+    from concurrent.futures import ThreadPoolExecutor
+    from utilities import read_rail_network
+    rail_network = read_rail_network("uk_stations.csv")
+    frozen = rail_network.freeze()
+    assert frozen.freeze() is frozen
+    assert not frozen._hub.flags.writeable and not frozen._region_rows[0].flags.writeable
+    assert frozen._lat is rail_network._lat   # shared, not copied
+    assert np.array_equal(frozen.fare_matrix(), rail_network.fare_matrix(), equal_nan=True)
+
+    for change in (lambda: frozen.set_hub("ABW"), lambda: frozen.remove_station("ABW"), lambda: frozen.update_location("ABW", 51, 0),
+                   lambda: frozen.add_station(Station("New", "London", "NEW", 51, 0, False)), lambda: frozen.enable_cache(),
+                   lambda: frozen.set_distance_mode("approx")):
+        with pytest.raises(FrozenNetworkError):
+            change()
+    with pytest.raises(FrozenNetworkError):
+        frozen.stations["ABW"].hub = True
+    with pytest.raises(RegionnonExistentError):
+        frozen.closest_hub(Station("Nowhere", "Nowhere", "NWH", 51, 0, False))
+
+    # The network it came from can still change, without changing the frozen copy
+    fares = frozen.fares_to("ABD")
+    rail_network.set_hub("ABW", not rail_network.stations["ABW"].hub)
+    rail_network.update_location("ABD", 57.0, -2.0)
+    assert rail_network._hub is not frozen._hub and rail_network._lat is not frozen._lat
+    assert np.array_equal(frozen.fares_to("ABD"), fares, equal_nan=True)
+    assert not np.array_equal(rail_network.fares_to("ABD"), fares, equal_nan=True)
+
+    # Queries from many threads give the same answers as from one
+    rng = np.random.default_rng(0)
+    pairs = frozen.crs_codes(rng.integers(0, frozen.n_stations(), (200, 2))).tolist()
+
+    def query(pair):
+        return ([s.crs for s in frozen.journey_planner(*pair)], frozen.journey_fare(*pair), frozen.closest_hub(frozen.stations[pair[0]]).crs,
+                frozen.cheapest_journey(*pair)[1], frozen.plan_batch([pair[0]], [pair[1]], fares=True)[2][0])
+    expected = [query(pair) for pair in pairs]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert list(pool.map(query, pairs)) == expected
+
+def assert_fare_changes(rail_network, version):
+    starts, dests, fares, version_fares = rail_network.fare_changes(version)
+    common = [crs for crs in rail_network.stations if crs in version.stations]
+    before, after = rail_network.fare_matrix(common, common), version.fare_matrix(common, common)
+    i, j = np.nonzero(~((before == after) | (np.isnan(before) & np.isnan(after))))
+    expected = {(common[a], common[b]): (before[a, b], after[a, b]) for a, b in zip(i.tolist(), j.tolist())}
+    found = {(start, dest): (fare, version_fare) for start, dest, fare, version_fare in zip(starts.tolist(), dests.tolist(), fares, version_fares)}
+    assert found.keys() == expected.keys()
+    for key, fares in found.items():
+        assert np.array_equal(fares, expected[key], equal_nan=True)
+
+def test_derive():
+    stations = [
+        Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False),
+        Station("Station A", "Region A", "HBA", 0, 1, True),
+        Station("Non-Hub Station B", "Region B", "NHB", 0, 3, False),
+        Station("Station B", "Region B", "HBB", 0, 5, True),
+        Station("Other Station B", "Region B", "OSB", 0, 2.5, False),
+        Station("Station C", "Region C", "HBC", 0, 8, True),
+    ]
+    rail_network = RailNetwork(list(stations))
+    fares = rail_network.fare_matrix()
+
+    # A version shares everything its changes don't touch
+    version = rail_network.derive([("set_hub", "OSB", True)])
+    assert version.stations["OSB"].hub and not rail_network.stations["OSB"].hub
+    assert version._lat is rail_network._lat and version._index is rail_network._index
+    assert version._region_rows[0] is rail_network._region_rows[0] and version._region_rows[1] is not rail_network._region_rows[1]
+    assert version._hub is not rail_network._hub
+    assert np.array_equal(rail_network.fare_matrix(), fares, equal_nan=True)
+    assert_fare_changes(rail_network, version)
+    starts, dests, _, _ = rail_network.fare_changes(version)
+    assert set(starts.tolist()) | set(dests.tolist()) >= {"NHB", "OSB", "HBB"} and ("NHA", "HBA") not in zip(starts, dests)
+
+    # Versions of versions, with stations moved, added and removed
+    moved = version.derive([("update_location", "HBA", 0, 0.5), ("remove_station", "HBC"),
+                            ("add_station", Station("Station D", "Region D", "HBD", 0, 9, True))])
+    assert moved._lat is not version._lat and moved._index is not version._index
+    assert "HBC" in version.stations and "HBD" not in version.stations
+    assert_fare_changes(version, moved)
+    assert_fare_changes(rail_network, moved)
+    assert_fare_changes(moved, moved.derive([("set_distance_mode", "approx")]))
+    assert len(rail_network.fare_changes(rail_network.derive())[0]) == 0
+
+    # The parent changes independently of its versions
+    rail_network.add_station(Station("Station E", "Region E", "HBE", 0, 12, True))
+    rail_network.set_hub("NHA", True)
+    assert "HBE" not in version.stations and not version.stations["NHA"].hub
+    assert stations[0].hub   # the parent still updates the stations it was built from
+    assert_fare_changes(rail_network, version)
+    assert_same_network(version, [Station(s.name, s.region, s.crs, s.lat, s.lon, s.hub) for s in version.stations.values()])
+
+    # Frozen networks derive mutable versions
+    frozen = rail_network.freeze()
+    assert type(frozen.derive([("set_hub", "NHB", True)])) is RailNetwork
+    with pytest.raises(ValueError):
+        rail_network.derive([("plot_network",)])
+
+def test_from_columns_copies_its_inputs():
+    lat, lon = np.array([0.0, 0.0, 0.0]), np.array([0.0, 1.0, 3.0])
+    hub = np.array([False, True, False])
+    regions = np.array([0, 0, 1], dtype=np.int32)
+    rail_network = RailNetwork.from_columns(["A", "B", "C"], regions, ["AAA", "BBB", "CCC"], lat, lon, hub, ["Region A", "Region B"])
+    rail_network.update_location("BBB", 10, 10)
+    rail_network.set_hub("CCC", True)
+    rail_network.freeze()
+    assert np.array_equal(lat, [0, 0, 0]) and np.array_equal(lon, [0, 1, 3]) and np.array_equal(hub, [False, True, False])
+    assert lat.flags.writeable and lon.flags.writeable and hub.flags.writeable and regions.flags.writeable
+    lat[0] = 1.0
+    assert rail_network.stations["AAA"].lat == 0.0
+
+def test_frozen_network_constructors(tmp_path):
+    from railway import FrozenRailNetwork, FrozenStation
+    stations = [Station("Station A", "Region A", "HBA", 0, 1, True), Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False),
+                Station("Station B", "Region B", "HBB", 0, 5, True)]
+    RailNetwork(stations).save_snapshot(tmp_path / "network.railsnap")
+    built = [
+        FrozenRailNetwork(stations),
+        FrozenRailNetwork.from_columns(["A", "B"], ["Region A", "Region B"], ["HBA", "HBB"], [0, 0], [1, 5], [True, True]),
+        FrozenRailNetwork.load_snapshot(tmp_path / "network.railsnap", mmap=False),
+    ]
+    for frozen in built:
+        assert type(frozen) is FrozenRailNetwork and not frozen._hub.flags.writeable and not frozen._nearest_hub.flags.writeable
+        assert frozen.cheapest_journey("HBA", "HBB")[0][-1].crs == "HBB"
+        assert isinstance(frozen.stations["HBA"], FrozenStation)
+        with pytest.raises(FrozenNetworkError):
+            frozen.set_hub("HBA", False)
+    assert stations[0].hub and type(stations[0]) is Station
+
+def test_nearest_hubs_by_grid():
+    from utilities import synthetic_network
+    rail_network = synthetic_network(20000, n_regions=2, hub_fraction=0.05)
+    assert rail_network._region_hub_counts.min() > 64   # large enough for the grid search
+    for mode in ("exact", "approx"):
+        rail_network.set_distance_mode(mode)
+        for code, rows in enumerate(rail_network._region_rows):
+            hubs = rail_network._region_hubs[code]
+            distances = rail_network._distances(rows[:, None], hubs[None, :])
+            expected = np.where(rail_network._hub[rows], rows, hubs[np.argmin(distances, axis=1)])
+            assert np.array_equal(rail_network._nearest_hub[rows], expected)
+            assert np.array_equal(rail_network._nearest_hub_distance[rows],
+                                  np.where(rail_network._hub[rows], 0.0, distances.min(axis=1)))
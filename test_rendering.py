@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from railway import invalidCRS
+from rendering import BatchRenderer, render_fare_histograms, render_journeys
+from utilities import read_rail_network
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+@pytest.mark.parametrize("shared_axes", [False, True])
+def test_render_fare_histograms(tmp_path, shared_axes, rail_network):
+    paths = render_fare_histograms(rail_network, tmp_path, shared_axes=shared_axes)
+    assert paths == [str(tmp_path / f"Fare_prices_to_{crs}.png") for crs in rail_network.stations]
+    for path in paths:
+        with open(path, "rb") as f:
+            assert f.read(8) == PNG
+
+def test_shared_histograms():
+    network = read_rail_network("uk_stations.csv")
+    rows = np.array([0, 10, 500])
+    counts, edges = BatchRenderer(network).shared_histograms(rows, bins=12, block_size=2)
+    assert counts.shape == (3, 12) and edges.size == 13
+    for row, row_counts in zip(rows, counts):
+        fares = network.fares_to(network._crs[row])
+        fares = np.delete(fares, row)
+        assert np.array_equal(row_counts, np.histogram(fares[~np.isnan(fares)], edges)[0])
+        assert edges[0] <= np.nanmin(fares) and np.nanmax(fares) <= edges[-1]
+
+def test_render_journeys(tmp_path, rail_network):
+    paths = render_journeys(rail_network, tmp_path, ["NHA", "HBA", "NHA"], ["NHB", "NHA", "NHC"])
+    assert paths == [str(tmp_path / "Journey_NHA_to_NHB.png"), str(tmp_path / "Journey_HBA_to_NHA.png"), None]
+    with open(paths[0], "rb") as f:
+        assert f.read(8) == PNG
+    with pytest.raises(invalidCRS):
+        render_journeys(rail_network, tmp_path, ["NHA"], ["XXX"])
@@ -0,0 +1,77 @@
+import heapq
+import numpy as np
+import pytest
+from railway import Station, RailNetwork, Nohub_InRegionError, invalidCRS
+from utilities import synthetic_network
+
+def dijkstra_fare(network, start, dest):
+    # Cheapest fare over the explicit station graph: non-hub stations link to the hubs of their region,
+    # hubs link to every hub, and the ends of a same-region journey link directly
+    region = network._region_codes
+    hubs = np.flatnonzero(network._hub).tolist()
+
+    def neighbours(row):
+        linked = [h for h in hubs if network._hub[row] or region[h] == region[row]]
+        if (row == start or network._hub[row]) and region[row] == region[dest]:
+            linked.append(dest)
+        return linked
+
+    best = {start: 0.0}
+    queue = [(0.0, start)]
+    while queue:
+        fare, row = heapq.heappop(queue)
+        if row == dest:
+            return fare
+        if fare > best[row]:
+            continue
+        for other in neighbours(row):
+            total = fare + network._route_fares(np.array([[row, other]]), np.array([1]))[0]
+            if total < best.get(other, np.inf):
+                best[other] = total
+                heapq.heappush(queue, (total, other))
+    return np.inf
+
+def test_cheapest_journey_matches_dijkstra():
+    network = synthetic_network(200, n_regions=4, hub_fraction=0.05, seed=3)
+    rng = np.random.default_rng(0)
+    hub, non_hub = int(np.flatnonzero(network._hub)[0]), int(np.flatnonzero(~network._hub)[0])
+    for start, dest in rng.integers(0, 200, (60, 2)).tolist() + [[hub, hub], [non_hub, non_hub]]:
+        journey, fare = network.cheapest_journey(network._crs[start], network._crs[dest])
+        if start == dest:
+            assert len(journey) == 2 and fare == network.journey_fare(network._crs[start], network._crs[dest]) == 1.0
+            continue
+        assert fare == pytest.approx(dijkstra_fare(network, start, dest), rel=1e-12)
+        rows = [network._index[station.crs] for station in journey]
+        assert (rows[0], rows[-1]) == (start, dest)
+        # Non-hub stations are only ever the ends of a route, and the fare is that of the route returned
+        assert all(network._hub[row] for row in rows[1:-1])
+        assert fare == network._journey_cost(journey)
+        assert fare <= network.journey_fare(network._crs[start], network._crs[dest])
+
+def test_cheapest_journey_through_intermediate_hub():
+    # Fares fall off with distance, so the long way round via a distant hub is cheaper than the direct leg
+    start = Station("Start", "Region A", "STA", 0, 0, True)
+    far = Station("Far Hub", "Region C", "FAR", 0, 6, True)
+    dest = Station("Dest", "Region B", "DST", 0, 1.8, True)
+    network = RailNetwork([start, far, dest])
+    assert network.journey_planner("STA", "DST") == [start, dest]
+    journey, fare = network.cheapest_journey("STA", "DST")
+    assert journey == [start, far, dest]
+    assert fare == network._journey_cost(journey) < network.journey_fare("STA", "DST")
+
+    # The table is rebuilt when the hubs change
+    network.set_hub("FAR", False)
+    assert network.cheapest_journey("STA", "DST")[0] == [start, dest]
+
+def test_cheapest_journey_errors():
+    hub_A = Station("Hub A", "Region A", "HBA", 0, 0, True)
+    non_hub_B = Station("Non-Hub B", "Region B", "NHB", 0, 1, False)
+    other_B = Station("Other B", "Region B", "OTB", 0, 1.5, False)
+    network = RailNetwork([hub_A, non_hub_B, other_B])
+    with pytest.raises(Nohub_InRegionError, match="Region B"):
+        network.cheapest_journey("HBA", "NHB")
+    assert network.cheapest_journey("NHB", "OTB")[0] == [non_hub_B, other_B]
+    assert network.cheapest_journey("HBA", "HBA") == ([hub_A, hub_A], 1.0)
+    assert network.cheapest_journey("NHB", "NHB") == ([non_hub_B, non_hub_B], network.journey_fare("NHB", "NHB"))
+    with pytest.raises(invalidCRS):
+        network.cheapest_journey("HBA", "XXX")
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from railway import invalidCRS
+from scenarios import HubScenarios
+from utilities import synthetic_network
+
+def changed_network(toggles):
+    network = synthetic_network(300, n_regions=4, hub_fraction=0.03, seed=2)
+    for crs, hub in toggles.items():
+        network.set_hub(crs, hub)
+    return network
+
+def test_evaluate_matches_changed_network():
+    network = synthetic_network(300, n_regions=4, hub_fraction=0.03, seed=2)
+    scenarios = HubScenarios(network, percentiles=(5, 50, 99))
+    base = network.fare_matrix()
+    region_one = [crs for crs in network.stations if network.stations[crs].region == "Region 1"]
+    cases = [
+        {network._crs[7]: not network._hub[7]},
+        {network._crs[7]: not network._hub[7], network._crs[200]: not network._hub[200]},
+        {crs: False for crs in region_one},   # Region 1 loses every hub
+    ]
+    for toggles in cases:
+        fares = changed_network(toggles).fare_matrix()
+        result = scenarios.evaluate(toggles)
+        planned = ~np.isnan(fares)
+        assert result["planned"] == planned.sum()
+        assert result["planned_delta"] == planned.sum() - (~np.isnan(base)).sum()
+        assert result["mean"] == pytest.approx(fares[planned].mean(), rel=1e-12)
+        for p in (5, 50, 99):
+            assert result["percentiles"][p] == pytest.approx(np.percentile(fares[planned], p), rel=1e-12)
+        changed = ~((fares == base) | (np.isnan(fares) & np.isnan(base)))
+        assert result["changed_journeys"] == changed.sum()
+        for region, delta in result["region_deltas"].items():
+            rows = network._region_rows[network._region_lookup[region]]
+            assert delta == pytest.approx(np.nanmean(fares[rows]) - np.nanmean(base[rows]), rel=1e-9, abs=1e-12)
+
+    # The network itself is left as it was
+    assert np.array_equal(network.fare_matrix(), base, equal_nan=True)
+
+def test_rank():
+    network = synthetic_network(300, n_regions=4, hub_fraction=0.03, seed=2)
+    scenarios = HubScenarios(network)
+    candidates = network.crs_codes(np.flatnonzero(~network._hub)[:20]).tolist()
+    ranked = scenarios.rank(candidates)
+    assert sorted(candidate for candidate, _ in ranked) == sorted(candidates)
+    deltas = [result["mean_delta"] for _, result in ranked]
+    assert deltas == sorted(deltas)
+    assert ranked[0][1]["mean_delta"] == pytest.approx(scenarios.evaluate(ranked[0][0])["mean_delta"], rel=1e-12)
+    assert ranked[0][1]["percentiles"] == {}
+    assert len(scenarios.rank(candidates, top=3)) == 3
+
+    with pytest.raises(invalidCRS):
+        scenarios.evaluate(["XXX"])
@@ -0,0 +1,66 @@
+import struct
+import pytest
+import numpy as np
+from railway import RailNetwork, Station
+from snapshot import SnapshotError, PREFIX, read_snapshot, write_snapshot
+from utilities import read_rail_network
+
+def test_snapshot_round_trip(tmp_path):
+    rail_network = read_rail_network("uk_stations.csv")
+    path = tmp_path / "uk.railsnap"
+    rail_network.save_snapshot(path)
+
+    for mmap in (True, False):
+        loaded = RailNetwork.load_snapshot(path, mmap=mmap)
+        assert list(loaded.stations) == list(rail_network.stations)
+        assert loaded.regions() == rail_network.regions()
+        assert np.array_equal(loaded._nearest_hub, rail_network._nearest_hub)
+        assert np.array_equal(loaded._region_hub_counts, rail_network._region_hub_counts)
+        assert loaded._hub.flags.writeable != mmap
+        assert loaded.stations["ABW"].name == "Abbey Wood"
+        assert np.array_equal(loaded.fares_to("EUS"), rail_network.fares_to("EUS"))
+        assert loaded.journey_fare("ABW", "ABE") == rail_network.journey_fare("ABW", "ABE")
+
+def test_mapped_snapshot_copies_on_change(tmp_path):
+    stations = [
+        Station("Non-Hub Station A", "Region A", "NHA", 0, 0, False),
+        Station("Station A", "Region A", "HBA", 0, 1, True),
+        Station("Station B", "Region B", "HBB", 0, 5, True),
+    ]
+    path = tmp_path / "small.railsnap"
+    RailNetwork(stations).save_snapshot(path)
+
+    loaded = RailNetwork.load_snapshot(path)
+    loaded.set_hub("NHA")
+    loaded.update_location("HBB", 1, 5)
+    assert [s.crs for s in loaded.hub_stations("Region A")] == ["NHA", "HBA"]
+    assert loaded.stations["HBB"].lat == 1
+
+    # The file itself is untouched
+    assert [s.crs for s in RailNetwork.load_snapshot(path).hub_stations("Region A")] == ["HBA"]
+
+def test_snapshot_rejects_bad_files(tmp_path):
+    path = tmp_path / "data.railsnap"
+    write_snapshot(path, {"values": np.arange(10), "labels": ["a", "bc"], "groups": [np.arange(2), np.arange(3)]})
+    state = read_snapshot(path)
+    assert state["labels"] == ["a", "bc"] and [g.tolist() for g in state["groups"]] == [[0, 1], [0, 1, 2]]
+
+    data = bytearray(path.read_bytes())
+
+    # Stale format version
+    stale = bytearray(data)
+    stale[8:12] = struct.pack("<I", 0)
+    (tmp_path / "stale.railsnap").write_bytes(stale)
+    with pytest.raises(SnapshotError, match="format version 0"):
+        read_snapshot(tmp_path / "stale.railsnap")
+
+    # Corrupted contents
+    corrupt = bytearray(data)
+    corrupt[-PREFIX.size] ^= 0xFF
+    (tmp_path / "corrupt.railsnap").write_bytes(corrupt)
+    with pytest.raises(SnapshotError, match="checksum"):
+        read_snapshot(tmp_path / "corrupt.railsnap")
+
+    # Not a snapshot at all
+    with pytest.raises(SnapshotError, match="not a rail network snapshot"):
+        RailNetwork.load_snapshot("uk_stations.csv")
@@ -0,0 +1,28 @@
+import numpy as np
+from spatial import SpatialGrid, unit_vectors, chord_length
+
+def test_grid_matches_brute_force():
+    rng = np.random.default_rng(0)
+    lat = np.radians(rng.uniform(50, 58, 3000))
+    lon = np.radians(rng.uniform(-6, 2, 3000))
+    grid = SpatialGrid(lat, lon)
+    points = unit_vectors(lat, lon)
+
+    # Queries inside and well outside the area covered by the points
+    for query_lat, query_lon in zip(rng.uniform(40, 65, 50), rng.uniform(-20, 10, 50)):
+        query_lat, query_lon = np.radians(query_lat), np.radians(query_lon)
+        chords = np.linalg.norm(points - unit_vectors(query_lat, query_lon), axis=1)
+        assert np.array_equal(grid.nearest(query_lat, query_lon, 7), np.lexsort((np.arange(3000), chords))[:7])
+        assert np.array_equal(grid.within(query_lat, query_lon, 0.01), np.flatnonzero(chords <= 0.01))
+
+def test_small_and_empty_grids():
+    grid = SpatialGrid(np.radians([10.0, 20.0]), np.radians([0.0, 0.0]))
+    assert grid.nearest(np.radians(18.0), 0.0, k=5).tolist() == [1, 0]
+
+    empty = SpatialGrid(np.empty(0), np.empty(0))
+    assert len(empty.nearest(0.0, 0.0, k=3)) == 0
+    assert len(empty.within(0.0, 0.0, 1.0)) == 0
+
+def test_chord_length():
+    assert np.isclose(chord_length(np.pi * 6371, 6371), 2)
+    assert np.isclose(chord_length(6371 * np.pi / 3, 6371), 1)
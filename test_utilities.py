@@ -0,0 +1,71 @@
+import io
+import pytest
+import numpy as np
+from railway import CRSDuplicateError
+from utilities import add_network_arguments, load_network, read_rail_network, synthetic_network
+
+HEADER = "crs,name,latitude,longitude,region,hub\n"
+
+def test_read_rail_network():
+    rail_network = read_rail_network("uk_stations.csv")
+    assert rail_network.n_stations() == 2395
+    assert len(rail_network.regions()) == 11
+    assert len(rail_network.hub_stations()) == 41
+    abbey_wood = rail_network.stations["ABW"]
+    assert (abbey_wood.name, abbey_wood.region, abbey_wood.lat, abbey_wood.lon, abbey_wood.hub) == ("Abbey Wood", "London", 51.490719, 0.120343, False)
+
+    # Reading in small chunks gives the same network
+    chunked = read_rail_network("uk_stations.csv", chunk_size=100)
+    assert list(chunked.stations) == list(rail_network.stations)
+    assert chunked.regions() == rail_network.regions()
+    assert np.array_equal(chunked._region_codes, rail_network._region_codes)
+    assert np.array_equal(chunked._hub, rail_network._hub)
+
+def test_read_rail_network_from_file_object():
+    csv_text = HEADER + 'AAA,"Station, A",50.5,-1.5,Region A,1\n\nBBB,Station B,51,-1,Region B,0\n'
+    rail_network = read_rail_network(io.StringIO(csv_text))
+    assert [s.name for s in rail_network.stations.values()] == ["Station, A", "Station B"]
+    assert rail_network.regions() == ["Region A", "Region B"]
+
+@pytest.mark.parametrize("row, message", [
+    ("abc,Station,50,0,Region,0", "Line 3: CRS code must be a 3-character string of uppercase letters"),
+    ("ABCD,Station,50,0,Region,0", "Line 3: CRS code must be a 3-character string of uppercase letters"),
+    ("ABC,Station,95,0,Region,0", r"Line 3: Latitude must be a decimal number in the range \[-90, 90\]"),
+    ("ABC,Station,north,0,Region,0", r"Line 3: Latitude must be a decimal number in the range \[-90, 90\]"),
+    ("ABC,Station,50,-181,Region,0", r"Line 3: Longitude must be a decimal number in the range \[-180, 180\]"),
+    ("ABC,Station,50,0,Region,yes", "Line 3: Hub must be an integer flag"),
+    ("ABC,Station,50,0,Region", "Line 3: expected 6 fields, got 5"),
+])
+def test_read_rail_network_invalid_rows(row, message):
+    csv_text = HEADER + "XYZ,Fine,50,0,Region,0\n" + row + "\n"
+    for chunk_size in (1, 10):
+        with pytest.raises(ValueError, match=message):
+            read_rail_network(io.StringIO(csv_text), chunk_size=chunk_size)
+
+def test_read_rail_network_duplicates():
+    csv_text = HEADER + "AAA,A,50,0,R,0\nBBB,B,50,0,R,0\nAAA,C,50,0,R,0\n"
+    for chunk_size in (1, 2, 10):
+        with pytest.raises(CRSDuplicateError, match="Line 4: Duplicate CRS code: AAA"):
+            read_rail_network(io.StringIO(csv_text), chunk_size=chunk_size)
+
+def test_synthetic_network():
+    network = synthetic_network(5000, n_regions=5, hub_fraction=0.01, seed=1)
+    assert network.n_stations() == 5000
+    assert network.regions() == [f"Region {code}" for code in range(5)]
+    assert all(network.hub_stations(region) for region in network.regions())
+    assert all(len(crs) == 3 for crs in network.stations)
+    # The same seed gives the same network
+    again = synthetic_network(5000, n_regions=5, hub_fraction=0.01, seed=1)
+    assert list(again.stations) == list(network.stations)
+    assert np.array_equal(again._lat, network._lat)
+    assert synthetic_network(30000).n_stations() == 30000
+
+def test_load_network(tmp_path):
+    import argparse
+    parser = argparse.ArgumentParser()
+    add_network_arguments(parser)
+    assert load_network(parser.parse_args([])).n_stations() == 2395
+    synthetic_network(50).save_snapshot(tmp_path / "network.railsnap")
+    assert load_network(parser.parse_args(["--snapshot", str(tmp_path / "network.railsnap")])).n_stations() == 50
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--snapshot", "a", "--stations", "b"])
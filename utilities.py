@@ -1,23 +1,165 @@
 from pathlib import Path
 import csv
 from typing import List
-from railway import RailNetwork, Station
+import numpy as np
+from railway import RailNetwork, CRSDuplicateError
 
-def read_rail_network(file_path: Path) -> RailNetwork:
-    stations: List[Station] = []
+def read_rail_network(file_path: Path, chunk_size: int = 100_000) -> RailNetwork:
+    """
+    Reads a station CSV file (crs, name, latitude, longitude, region and hub columns) into a RailNetwork.
 
+    The file is streamed in chunks of chunk_size rows that are parsed straight into column arrays and
+    validated with vectorised checks, so no per-row dicts or Station objects are created. file_path can
+    also be an open text file. Invalid values raise ValueError (or CRSDuplicateError) naming the line.
+    """
+    if hasattr(file_path, "read"):
+        return _read_stations(file_path, chunk_size)
     with open(file_path, newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            # Extract values from the row based on header information
-            name = row.get('name', '')
-            region = row.get('region', '')
-            crs = row.get('crs', '')
-            lat = float(row.get('latitude', 0.0))
-            lon = float(row.get('longitude', 0.0))
-            hub = bool(int(row.get('hub', 0)))
-            stations.append(Station(name, region, crs, lat, lon, hub))
-    return RailNetwork(stations)
+        return _read_stations(csvfile, chunk_size)
+
+def add_network_arguments(parser):
+    """Adds the options the command line tools build their network from: --stations or --snapshot."""
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--stations", default="uk_stations.csv", help="station CSV file to build the network from")
+    source.add_argument("--snapshot", help="network snapshot saved with RailNetwork.save_snapshot")
+
+def load_network(args):
+    """The network chosen with the options of add_network_arguments: the snapshot if given, else the station file."""
+    if args.snapshot:
+        return RailNetwork.load_snapshot(args.snapshot)
+    return read_rail_network(args.stations)
+
+def synthetic_network(n_stations: int, n_regions: int = 12, hub_fraction: float = 0.02, seed: int = 0) -> RailNetwork:
+    """
+    Builds a random network for testing and benchmarking, with stations scattered over a UK-sized area.
+
+    Regions are vertical bands of the area and every region gets at least one hub; about hub_fraction of
+    the stations are hubs. Networks of up to 17,576 stations get valid three-letter CRS codes; larger ones
+    use longer "X0000001" style codes, which the columnar store accepts but Station validation would not.
+    """
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(50.0, 58.5, n_stations)
+    lon = rng.uniform(-6.0, 2.0, n_stations)
+    regions = np.minimum(((lon + 6.0) / 8.0 * n_regions).astype(np.int32), n_regions - 1)
+    hub = rng.random(n_stations) < hub_fraction
+    first_in_region = np.unique(regions, return_index=True)[1]
+    hub[first_in_region] = True
+
+    if n_stations <= 26 ** 3:
+        letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+        codes = rng.permutation(26 ** 3)[:n_stations]
+        crs = np.char.add(np.char.add(letters[codes // 676], letters[codes // 26 % 26]), letters[codes % 26])
+    else:
+        crs = np.char.add("X", np.char.zfill(np.arange(n_stations).astype(str), 7))
+    names = [f"Station {i}" for i in range(n_stations)]
+    return RailNetwork.from_columns(names, regions, crs, lat, lon, hub,
+                                    region_names=[f"Region {code}" for code in range(n_regions)])
+
+def _read_stations(csvfile, chunk_size):
+    reader = csv.reader(csvfile)
+    header = next(reader, [])
+    columns = {field: position for position, field in enumerate(header)}
+
+    names: List[str] = []
+    crs_chunks, lat_chunks, lon_chunks, hub_chunks, region_chunks = [], [], [], [], []
+    region_names: List[str] = []
+    region_lookup = {}
+    known_crs = set()
+
+    rows, lines = [], []
+    for row in reader:
+        if not row:   # blank lines are skipped, like csv.DictReader does
+            continue
+        rows.append(row)
+        lines.append(reader.line_num)
+        if len(rows) < chunk_size:
+            continue
+        _parse_chunk(rows, lines, columns, len(header), names, crs_chunks, lat_chunks, lon_chunks, hub_chunks,
+                     region_chunks, region_names, region_lookup, known_crs)
+        rows, lines = [], []
+    if rows:
+        _parse_chunk(rows, lines, columns, len(header), names, crs_chunks, lat_chunks, lon_chunks, hub_chunks,
+                     region_chunks, region_names, region_lookup, known_crs)
+
+    def joined(chunks, dtype):
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+
+    return RailNetwork.from_columns(names, joined(region_chunks, np.int32), joined(crs_chunks, "<U3"),
+                                    joined(lat_chunks, np.float64), joined(lon_chunks, np.float64),
+                                    joined(hub_chunks, bool), region_names=region_names)
+
+def _parse_chunk(rows, lines, columns, width, names, crs_chunks, lat_chunks, lon_chunks, hub_chunks,
+                 region_chunks, region_names, region_lookup, known_crs):
+    # Converts one chunk of CSV rows into column arrays, checking every value with vectorised operations
+    lines = np.asarray(lines)
+    ragged = np.fromiter(map(len, rows), dtype=np.intp, count=len(rows)) != width
+    if ragged.any():
+        bad = np.argmax(ragged)
+        raise ValueError(f"Line {lines[bad]}: expected {width} fields, got {len(rows[bad])}")
+    fields = list(zip(*rows))
+
+    def column(name, default):
+        return fields[columns[name]] if name in columns else (default,) * len(rows)
+
+    def numbers(name, default, dtype, message):
+        values = column(name, default)
+        try:
+            return np.array(values, dtype=dtype)
+        except ValueError:
+            bad = next(i for i, value in enumerate(values) if not _parses(value, dtype))
+            raise ValueError(f"Line {lines[bad]}: {message}") from None
+
+    crs = np.array(column('crs', ''), dtype="<U4")   # one spare character so longer codes are caught
+    bad = ~((np.char.str_len(crs) == 3) & np.char.isalpha(crs) & np.char.isupper(crs))
+    if bad.any():
+        raise ValueError(f"Line {lines[np.argmax(bad)]}: CRS code must be a 3-character string of uppercase letters")
+    crs = crs.astype("<U3")
+
+    lat = numbers('latitude', '0.0', np.float64, "Latitude must be a decimal number in the range [-90, 90]")
+    bad = (lat < -90) | (lat > 90)
+    if bad.any():
+        raise ValueError(f"Line {lines[np.argmax(bad)]}: Latitude must be a decimal number in the range [-90, 90]")
+
+    lon = numbers('longitude', '0.0', np.float64, "Longitude must be a decimal number in the range [-180, 180]")
+    bad = (lon < -180) | (lon > 180)
+    if bad.any():
+        raise ValueError(f"Line {lines[np.argmax(bad)]}: Longitude must be a decimal number in the range [-180, 180]")
+
+    hub = numbers('hub', '0', np.int64, "Hub must be an integer flag").astype(bool)
+
+    # Duplicate CRS codes, both inside the chunk and against the chunks read before it
+    codes = crs.tolist()
+    if len(set(codes)) != len(codes) or not known_crs.isdisjoint(codes):
+        seen = set()
+        for i, code in enumerate(codes):
+            if code in seen or code in known_crs:
+                raise CRSDuplicateError(f"Line {lines[i]}: Duplicate CRS code: {code} is not allowed in the same RailNetwork")
+            seen.add(code)
+    known_crs.update(codes)
+
+    # Region names become integer codes, numbered in order of first appearance
+    unique, first, inverse = np.unique(np.array(column('region', ''), dtype=str), return_index=True, return_inverse=True)
+    lookup = np.empty(unique.size, dtype=np.int32)
+    for position in np.argsort(first):
+        region = str(unique[position])
+        if region not in region_lookup:
+            region_lookup[region] = len(region_names)
+            region_names.append(region)
+        lookup[position] = region_lookup[region]
+
+    names.extend(column('name', ''))
+    crs_chunks.append(crs)
+    lat_chunks.append(lat)
+    lon_chunks.append(lon)
+    hub_chunks.append(hub)
+    region_chunks.append(lookup[inverse])
+
+def _parses(value, dtype):
+    try:
+        np.array([value], dtype=dtype)
+        return True
+    except ValueError:
+        return False
 
 
     # file = open(filepath)